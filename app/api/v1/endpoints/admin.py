@@ -0,0 +1,76 @@
+from typing import Any, Dict
+
+from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi.responses import PlainTextResponse
+
+from app.schemas.admin import IngestionJobRequest, IngestionJobStatus, ProfileResult
+from app.services.ingestion_job_service import cancel_job, get_job_status, submit_job
+from app.core.profiling import get_profile, get_profiling_stats, list_profiles
+from app.core.security import get_current_admin
+
+router = APIRouter()
+
+async def _submit(kind: str, request: IngestionJobRequest) -> IngestionJobStatus:
+    try:
+        job = await submit_job(kind, request.table_name, request.project)
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    return IngestionJobStatus(**job)
+
+@router.post("/vector-store/ingest", response_model=IngestionJobStatus, status_code=status.HTTP_202_ACCEPTED)
+async def queue_ingest_job(request: IngestionJobRequest, current_admin_payload: dict = Depends(get_current_admin)):
+    """
+    Queues a background job that adds the table's rows to the live vector store collection.
+    """
+    return await _submit("ingest", request)
+
+@router.post("/vector-store/reindex", response_model=IngestionJobStatus, status_code=status.HTTP_202_ACCEPTED)
+async def queue_reindex_job(request: IngestionJobRequest, current_admin_payload: dict = Depends(get_current_admin)):
+    """
+    Queues a background blue/green rebuild of the vector store: the table is ingested into a
+    shadow collection that replaces the live one atomically when complete.
+    """
+    return await _submit("reindex", request)
+
+@router.get("/jobs/{job_id}", response_model=IngestionJobStatus)
+async def get_ingestion_job(job_id: str, current_admin_payload: dict = Depends(get_current_admin)):
+    """Returns the status and progress of an ingestion job."""
+    job = await get_job_status(job_id)
+    if job is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Job not found")
+    return IngestionJobStatus(**job)
+
+@router.post("/jobs/{job_id}/cancel", response_model=IngestionJobStatus)
+async def cancel_ingestion_job(job_id: str, current_admin_payload: dict = Depends(get_current_admin)):
+    """Requests cancellation of a queued or running ingestion job."""
+    job = await cancel_job(job_id)
+    if job is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Job not found")
+    return IngestionJobStatus(**job)
+
+@router.get("/profiles")
+async def list_request_profiles(current_admin_payload: dict = Depends(get_current_admin)) -> Dict[str, Any]:
+    """
+    Lists the profiles stored by this worker (explicit, sampled and slow-request captures),
+    most recent first, with profiling settings and event-loop block statistics.
+    """
+    return {"profiling": get_profiling_stats(), "profiles": list_profiles()}
+
+@router.get("/profiles/{profile_id}", response_model=ProfileResult)
+async def get_request_profile(profile_id: str, current_admin_payload: dict = Depends(get_current_admin)):
+    """Returns a profile: stage timings, collapsed stacks or cProfile stats, and event-loop blocks."""
+    profile = await get_profile(profile_id)
+    if profile is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Profile not found")
+    return ProfileResult(**profile)
+
+@router.get("/profiles/{profile_id}/collapsed", response_class=PlainTextResponse)
+async def get_request_profile_stacks(profile_id: str, current_admin_payload: dict = Depends(get_current_admin)):
+    """Returns the profile's stack samples in collapsed format, ready for flamegraph.pl or speedscope."""
+    profile = await get_profile(profile_id)
+    if profile is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Profile not found")
+    return PlainTextResponse(
+        profile["collapsed_stacks"],
+        headers={"Content-Disposition": f'attachment; filename="profile_{profile_id}.folded"'},
+    )
@@ -1,23 +1,51 @@
-from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.ext.asyncio import AsyncSession
+import time
+from contextlib import AsyncExitStack
+from typing import AsyncIterator, Literal, Optional
+
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, Response, status
+from fastapi.responses import StreamingResponse
+from starlette.background import BackgroundTask
 
 from app.schemas.chat import ChatRequest, ChatResponse
-from app.services.chat_processing_service import process_chat_message
-from app.core.security import get_current_user
-from app.db.session import get_db
+from app.services.chat_processing_service import answer_etag, is_cheap_request, process_chat_message, revalidate_cached_answer
+from app.services.coalescing_service import get_coalescing_stats
+from app.services.database_service import get_data_version
+from app.services.export_service import EXPORT_FORMATS, get_export_query, stream_export
+from app.services.sql_prompt_service import get_prompt_token_stats
+from app.core.admission import chat_admission, export_admission
+from app.core.profiling import profile_request, requested_profile_mode, stage
+from app.core.security import get_current_admin, get_current_user, is_admin
 
 router = APIRouter()
 
+# Clients must revalidate, and shared caches must not store answers
+CHAT_CACHE_CONTROL = "private, no-cache"
+
+def _etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    if not if_none_match:
+        return False
+    # Weak comparison, as for GET: the W/ prefix is ignored. "*" is not accepted: a 304 has no
+    # body, so it is only sent to clients that show they hold this exact answer.
+    candidates = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+    return etag.removeprefix("W/") in candidates
+
 @router.post("/", response_model=ChatResponse)
 async def handle_chat_message(
     request: ChatRequest,
-    db: AsyncSession = Depends(get_db),
     # current_user_payload will contain the decoded JWT payload (e.g., user_id, username, exp)
-    current_user_payload: dict = Depends(get_current_user) 
+    current_user_payload: dict = Depends(get_current_user),
+    if_none_match: Optional[str] = Header(None),
+    x_profile: Optional[str] = Header(None)
 ):
     """
     Processes a chat message.
     The message can be a query for the database or a general question for an AI model.
+    No database session is held here: the (possibly shared) query work opens its own.
+    Answers backed by query results carry an ETag (answer cache key + data version of the
+    Text-to-SQL tables); re-asking with If-None-Match gets a 304 while the data is unchanged
+    and the answer is still cached.
+    Admins can profile the request with "X-Profile: sample" (or "cprofile"); the result ID is
+    returned in X-Profile-Id and can be read from GET /admin/profiles/{profile_id}.
     """
     # Example: Accessing user_id from token (adjust key based on your Django JWT payload)
     # token_user_id = current_user_payload.get("user_id") or current_user_payload.get("sub")
@@ -27,9 +55,88 @@ async def handle_chat_message(
     # if request.usuario_id != str(token_user_id):
     #     raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="User ID in request does not match token")
 
-    response_text, json_data = await process_chat_message( # Capture json_data
-        db=db,
-        message=request.message,  # Updated to match new field name
-        user_id=request.user_id   # Updated to match new field name
+    profile_mode, profile_trigger = requested_profile_mode(x_profile, x_profile is not None and is_admin(current_user_payload))
+    async with profile_request("chat", profile_mode, profile_trigger) as profile:
+        data_version = await get_data_version()
+        etag = answer_etag(request.message, request.user_id, data_version) if data_version else None
+        # Revalidation is answered before admission: it costs no pipeline work. It is only
+        # answered while the answer is still cached, so the client's export ID stays valid.
+        if etag and _etag_matches(if_none_match, etag) and await revalidate_cached_answer(request.message, data_version):
+            return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers={"ETag": etag, "Cache-Control": CHAT_CACHE_CONTROL})
+
+        # Admission control: limits are enforced per authenticated user (from the token, not the body).
+        # Cached answers and ID lookups run with priority so they are not queued behind slow pipelines.
+        user_key = str(current_user_payload.get("user_id") or current_user_payload.get("sub"))
+        # Reads only the small answer marker, not the cached answer itself
+        priority = await is_cheap_request(request.message, data_version)
+        wait_start = time.perf_counter()
+        async with chat_admission.admit(user_key, priority=priority):
+            profile.add_stage("admission_wait", wait_start, time.perf_counter())
+            response_text, json_data, export_id = await process_chat_message( # Capture json_data
+                message=request.message,  # Updated to match new field name
+                user_id=request.user_id   # Updated to match new field name
+            )
+        chat_response = ChatResponse(answer=response_text, user_id=request.user_id, json_data=json_data, export_id=export_id) # Updated to match new field name
+
+        # Only cached answers (backed by query results with rows) are validated by ETag
+        headers = {"ETag": etag, "Cache-Control": CHAT_CACHE_CONTROL} if etag and json_data else {}
+        # Serialized in one pass by pydantic-core (large json_data is the bulk of the response time)
+        with stage("serialization"):
+            response = Response(content=chat_response.model_dump_json(), media_type="application/json", headers=headers)
+    if profile.stored:
+        response.headers["X-Profile-Id"] = profile.id
+    return response
+
+@router.get("/export/{export_id}")
+async def export_chat_result(
+    export_id: str,
+    format: Literal["csv", "arrow"] = Query("csv"),
+    compression: Optional[Literal["zstd"]] = Query(None),
+    current_user_payload: dict = Depends(get_current_user)
+):
+    """
+    Streams the full result behind a chat answer (see ChatResponse.export_id) as CSV or
+    Apache Arrow IPC, optionally zstd-compressed. Rows are read from a server-side cursor,
+    so memory use does not depend on the size of the result.
+    """
+    query = await get_export_query(export_id)
+    if query is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Export not found or expired. Ask the question again.")
+
+    # The admission slot is held until the stream ends, not just until this function returns
+    user_key = str(current_user_payload.get("user_id") or current_user_payload.get("sub"))
+    slot = AsyncExitStack()
+    await slot.enter_async_context(export_admission.admit(user_key))
+
+    async def body() -> AsyncIterator[bytes]:
+        try:
+            async for chunk in stream_export(query, format, compression):
+                yield chunk
+        finally:
+            await slot.aclose()
+
+    media_type, extension = EXPORT_FORMATS[format]
+    filename = f"export_{export_id}.{extension}"
+    if compression == "zstd":
+        media_type, filename = "application/zstd", filename + ".zst"
+    return StreamingResponse(
+        body(),
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+        # Also releases the slot if the stream never starts (closing twice is a no-op)
+        background=BackgroundTask(slot.aclose),
     )
-    return ChatResponse(answer=response_text, user_id=request.user_id, json_data=json_data) # Updated to match new field name
+
+@router.get("/metrics")
+async def get_chat_metrics(current_user_payload: dict = Depends(get_current_admin)):
+    """
+    Returns runtime counters for the chat pipeline: how many calls were coalesced into an
+    already in-flight identical request, admission queue length and rejections, and SQL prompt sizes.
+    Admin only: the counters describe the load of the whole service.
+    """
+    return {
+        "coalescing": get_coalescing_stats(),
+        "admission": chat_admission.stats(),
+        "export_admission": export_admission.stats(),
+        "sql_prompt": get_prompt_token_stats(),
+    }
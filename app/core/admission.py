@@ -0,0 +1,153 @@
+import asyncio
+import math
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import Any, Deque, Dict
+
+from fastapi import HTTPException, status
+
+from app.core.config import settings
+
+class AdmissionController:
+    """
+    Bounds how many chat pipelines (or exports) run at once (limits are per worker process).
+    - At most `max_concurrent` pipelines run globally, plus `priority_slots` reserved for
+      cheap requests (cached answers, ID lookups) so they are not stuck behind slow ones.
+    - Each user may have at most `max_per_user` requests running or queued (429 otherwise).
+    - Requests over the limit wait in a bounded FIFO queue; when the queue is full, or a
+      request's queue deadline passes, it is shed with 503. Both carry a Retry-After header.
+    """
+
+    def __init__(self, max_concurrent: int, max_per_user: int, priority_slots: int, max_queued: int, queue_timeout: float):
+        self.max_concurrent = max_concurrent
+        self.max_per_user = max_per_user
+        self.priority_slots = priority_slots
+        self.max_queued = max_queued
+        self.queue_timeout = queue_timeout
+
+        self._active = 0
+        self._load_per_user: Dict[str, int] = {}
+        self._waiters: Dict[bool, Deque[asyncio.Future]] = {True: deque(), False: deque()}
+        # Exponentially weighted average of pipeline duration, used for Retry-After hints
+        self._avg_duration = 1.0
+
+        self.admitted = 0
+        self.rejected_user_limit = 0
+        self.rejected_queue_full = 0
+        self.shed_deadline = 0
+
+    def _limit(self, priority: bool) -> int:
+        return self.max_concurrent + (self.priority_slots if priority else 0)
+
+    def _queued(self) -> int:
+        return len(self._waiters[True]) + len(self._waiters[False])
+
+    def _can_start(self, priority: bool) -> bool:
+        if self._active >= self._limit(priority):
+            return False
+        # Keep FIFO order: never overtake a waiter of the same (or higher) priority
+        if self._waiters[True]:
+            return False
+        return priority or not self._waiters[False]
+
+    def _retry_after(self) -> str:
+        return str(max(1, math.ceil(self._avg_duration * (self._queued() + 1) / self.max_concurrent)))
+
+    def _reject(self, status_code: int, detail: str) -> HTTPException:
+        return HTTPException(status_code=status_code, detail=detail, headers={"Retry-After": self._retry_after()})
+
+    def _wake_waiters(self):
+        # Priority waiters first: they may also use the reserved slots
+        for priority in (True, False):
+            waiters = self._waiters[priority]
+            while waiters and self._active < self._limit(priority):
+                waiter = waiters.popleft()
+                if waiter.done():
+                    continue
+                self._active += 1
+                waiter.set_result(None)
+
+    def _release(self, duration: float):
+        self._active -= 1
+        self._avg_duration = 0.8 * self._avg_duration + 0.2 * duration
+        self._wake_waiters()
+
+    async def _acquire(self, priority: bool):
+        if self._can_start(priority):
+            self._active += 1
+            return
+
+        if self._queued() >= self.max_queued:
+            self.rejected_queue_full += 1
+            raise self._reject(status.HTTP_503_SERVICE_UNAVAILABLE, "The service is busy. Please retry later.")
+
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters[priority].append(waiter)
+        try:
+            await asyncio.wait_for(waiter, timeout=self.queue_timeout)
+        except BaseException as e:
+            if waiter.done() and not waiter.cancelled():
+                # The slot was granted just as this request gave up; hand it to the next waiter
+                self._active -= 1
+                self._wake_waiters()
+            else:
+                try:
+                    self._waiters[priority].remove(waiter)
+                except ValueError:
+                    pass
+            if isinstance(e, asyncio.TimeoutError):
+                self.shed_deadline += 1
+                raise self._reject(status.HTTP_503_SERVICE_UNAVAILABLE, "The request waited too long to be processed. Please retry later.")
+            raise
+
+    @asynccontextmanager
+    async def admit(self, user_key: str, priority: bool = False):
+        """Holds a pipeline slot for the duration of the `async with` block."""
+        user_load = self._load_per_user.get(user_key, 0)
+        if user_load >= self.max_per_user:
+            self.rejected_user_limit += 1
+            raise self._reject(status.HTTP_429_TOO_MANY_REQUESTS, "Too many concurrent requests for this user.")
+
+        self._load_per_user[user_key] = user_load + 1
+        try:
+            await self._acquire(priority)
+            self.admitted += 1
+            start = time.monotonic()
+            try:
+                yield
+            finally:
+                self._release(time.monotonic() - start)
+        finally:
+            self._load_per_user[user_key] -= 1
+            if not self._load_per_user[user_key]:
+                del self._load_per_user[user_key]
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "active": self._active,
+            "queued": self._queued(),
+            "queued_priority": len(self._waiters[True]),
+            "admitted": self.admitted,
+            "rejected_user_limit": self.rejected_user_limit,
+            "rejected_queue_full": self.rejected_queue_full,
+            "shed_deadline": self.shed_deadline,
+            "avg_pipeline_seconds": round(self._avg_duration, 3),
+        }
+
+chat_admission = AdmissionController(
+    max_concurrent=settings.ADMISSION_MAX_CONCURRENT,
+    max_per_user=settings.ADMISSION_MAX_PER_USER,
+    priority_slots=settings.ADMISSION_PRIORITY_SLOTS,
+    max_queued=settings.ADMISSION_MAX_QUEUED,
+    queue_timeout=settings.ADMISSION_QUEUE_TIMEOUT_SECONDS,
+)
+
+# Full-result exports hold a database connection while streaming, so they have their own, smaller pool
+export_admission = AdmissionController(
+    max_concurrent=settings.EXPORT_MAX_CONCURRENT,
+    max_per_user=2,
+    priority_slots=0,
+    max_queued=settings.EXPORT_MAX_CONCURRENT * 2,
+    queue_timeout=settings.ADMISSION_QUEUE_TIMEOUT_SECONDS,
+)
@@ -0,0 +1,165 @@
+import asyncio
+import hashlib
+import json
+import os
+import tempfile
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Optional
+
+from app.core.config import settings
+
+class CacheBackend:
+    """
+    Interface for caches shared by the chat pipeline (schema snapshots, answers).
+    Values must be JSON-serializable so any backend can store them across processes.
+    """
+
+    async def get(self, key: str) -> Optional[Any]:
+        raise NotImplementedError
+
+    async def set(self, key: str, value: Any, ttl_seconds: Optional[float] = None):
+        raise NotImplementedError
+
+    async def delete(self, key: str):
+        raise NotImplementedError
+
+class MemoryCacheBackend(CacheBackend):
+    """
+    Per-process cache. Suitable for a single worker; with several workers each one
+    keeps its own copy.
+    """
+
+    def __init__(self, max_entries: int = 1000):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, tuple[Optional[float], Any]]" = OrderedDict()
+
+    async def get(self, key: str) -> Optional[Any]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires_at, value = entry
+        if expires_at is not None and expires_at <= time.time():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return value
+
+    async def set(self, key: str, value: Any, ttl_seconds: Optional[float] = None):
+        expires_at = time.time() + ttl_seconds if ttl_seconds else None
+        self._entries[key] = (expires_at, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    async def delete(self, key: str):
+        self._entries.pop(key, None)
+
+class FileCacheBackend(CacheBackend):
+    """
+    Cross-process cache for a single node: one JSON file per key in a shared directory.
+    By default the directory lives in /dev/shm (tmpfs), so reads and writes stay in memory.
+    Writes go to a temporary file and are renamed into place, so readers never see partial data.
+    """
+
+    PURGE_EVERY_N_WRITES = 200
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        os.makedirs(self.directory, exist_ok=True)
+        self._writes = 0
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, hashlib.sha256(key.encode()).hexdigest() + ".json")
+
+    def _read(self, key: str) -> Optional[Any]:
+        path = self._path(key)
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                entry = json.load(f)
+        except (FileNotFoundError, ValueError):
+            return None
+        if entry["expires_at"] is not None and entry["expires_at"] <= time.time():
+            self._remove(path)
+            return None
+        return entry["value"]
+
+    def _write(self, key: str, value: Any, ttl_seconds: Optional[float]):
+        expires_at = time.time() + ttl_seconds if ttl_seconds else None
+        path = self._path(key)
+        # Unique temporary file per write: concurrent writes of the same key (from threads of
+        # this worker or from other workers) must not share it
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        try:
+            with open(fd, "w", encoding="utf-8") as f:
+                json.dump({"expires_at": expires_at, "value": value}, f)
+            os.replace(tmp_path, path)
+        except BaseException:
+            self._remove(tmp_path)
+            raise
+
+        self._writes += 1
+        if self._writes % self.PURGE_EVERY_N_WRITES == 0:
+            self._purge_expired()
+
+    def _purge_expired(self):
+        try:
+            names = os.listdir(self.directory)
+        except OSError as e:
+            print(f"Could not list cache directory {self.directory}: {e}")
+            return
+        for name in names:
+            if not name.endswith(".json"):
+                continue
+            path = os.path.join(self.directory, name)
+            try:
+                with open(path, "r", encoding="utf-8") as f:
+                    expires_at = json.load(f)["expires_at"]
+            except (OSError, ValueError, KeyError):
+                continue
+            if expires_at is not None and expires_at <= time.time():
+                self._remove(path)
+
+    @staticmethod
+    def _remove(path: str):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            print(f"Could not remove cache file {path}: {e}")
+
+    async def get(self, key: str) -> Optional[Any]:
+        return await asyncio.to_thread(self._read, key)
+
+    async def set(self, key: str, value: Any, ttl_seconds: Optional[float] = None):
+        # The cache is an optimization: a failed write (e.g. ENOSPC on a small /dev/shm)
+        # must not fail the request that produced the value
+        try:
+            await asyncio.to_thread(self._write, key, value, ttl_seconds)
+        except OSError as e:
+            print(f"Could not write cache key '{key}': {e}")
+
+    async def delete(self, key: str):
+        await asyncio.to_thread(self._remove, self._path(key))
+
+# Available backends, selected with the CACHE_BACKEND setting.
+# Other implementations (e.g. Redis for multi-node deployments) can be added with register_cache_backend.
+_backend_factories: Dict[str, Callable[[], CacheBackend]] = {
+    "memory": lambda: MemoryCacheBackend(),
+    "file": lambda: FileCacheBackend(settings.CACHE_DIR),
+}
+_shared_cache: Optional[CacheBackend] = None
+
+def register_cache_backend(name: str, factory: Callable[[], CacheBackend]):
+    _backend_factories[name] = factory
+
+def get_shared_cache() -> CacheBackend:
+    """Returns the process-wide cache backend, creating it on first use."""
+    global _shared_cache
+    if _shared_cache is None:
+        factory = _backend_factories.get(settings.CACHE_BACKEND)
+        if factory is None:
+            raise ValueError(f"Unknown CACHE_BACKEND '{settings.CACHE_BACKEND}'. Available: {sorted(_backend_factories)}")
+        _shared_cache = factory()
+    return _shared_cache
@@ -0,0 +1,151 @@
+import zlib
+from typing import Dict, Optional
+
+import brotli
+import zstandard
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+# Content types that are already compressed or must not be buffered
+EXCLUDED_CONTENT_TYPES = ("text/event-stream", "application/zstd", "application/gzip", "image/", "video/")
+
+class _Compressor:
+    """Incremental compressor; `compress(data, final=False)` returns the bytes ready to send."""
+
+    def compress(self, data: bytes, final: bool) -> bytes:
+        raise NotImplementedError
+
+class _GzipCompressor(_Compressor):
+    def __init__(self):
+        self._compressor = zlib.compressobj(6, zlib.DEFLATED, 31)  # wbits=31: gzip container
+
+    def compress(self, data: bytes, final: bool) -> bytes:
+        out = self._compressor.compress(data)
+        return out + self._compressor.flush(zlib.Z_FINISH if final else zlib.Z_SYNC_FLUSH)
+
+class _ZstdCompressor(_Compressor):
+    def __init__(self):
+        self._compressor = zstandard.ZstdCompressor(level=3).compressobj()
+
+    def compress(self, data: bytes, final: bool) -> bytes:
+        out = self._compressor.compress(data)
+        return out + self._compressor.flush(
+            zstandard.COMPRESSOBJ_FLUSH_FINISH if final else zstandard.COMPRESSOBJ_FLUSH_BLOCK
+        )
+
+class _BrotliCompressor(_Compressor):
+    def __init__(self):
+        self._compressor = brotli.Compressor(quality=4)
+
+    def compress(self, data: bytes, final: bool) -> bytes:
+        out = self._compressor.process(data)
+        return out + (self._compressor.finish() if final else self._compressor.flush())
+
+# In order of preference when the client accepts several with the same q-value
+COMPRESSORS = {
+    "zstd": _ZstdCompressor,
+    "br": _BrotliCompressor,
+    "gzip": _GzipCompressor,
+}
+
+def negotiate_encoding(accept_encoding: str) -> Optional[str]:
+    """Picks the best supported encoding from an Accept-Encoding header, honoring q-values."""
+    accepted: Dict[str, float] = {}
+    for part in accept_encoding.split(","):
+        name, _, params = part.strip().partition(";")
+        name = name.strip().lower()
+        quality = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+        if name:
+            accepted[name] = quality
+
+    best, best_quality = None, 0.0
+    for encoding in COMPRESSORS:
+        quality = accepted.get(encoding, accepted.get("*", 0.0))
+        if quality > best_quality:
+            best, best_quality = encoding, quality
+    return best
+
+class CompressionMiddleware:
+    """
+    Compresses responses with zstd, brotli or gzip, as negotiated with Accept-Encoding.
+    Bodies smaller than `minimum_size` are sent as is. Streaming responses are compressed
+    chunk by chunk, so exports keep flowing instead of being buffered.
+    """
+
+    def __init__(self, app: ASGIApp, minimum_size: int = 1024):
+        self.app = app
+        self.minimum_size = minimum_size
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        encoding = negotiate_encoding(Headers(scope=scope).get("accept-encoding", ""))
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+        await _CompressionResponder(self.app, encoding, self.minimum_size)(scope, receive, send)
+
+class _CompressionResponder:
+    def __init__(self, app: ASGIApp, encoding: str, minimum_size: int):
+        self.app = app
+        self.encoding = encoding
+        self.minimum_size = minimum_size
+        self.send: Optional[Send] = None
+        self.initial_message: Message = {}
+        self.started = False
+        self.passthrough = False
+        self.compressor: Optional[_Compressor] = None
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        self.send = send
+        await self.app(scope, receive, self.send_with_compression)
+
+    async def send_with_compression(self, message: Message):
+        if message["type"] == "http.response.start":
+            # Held back until the first body chunk tells us whether to compress
+            self.initial_message = message
+            headers = Headers(raw=message["headers"])
+            self.passthrough = (
+                "content-encoding" in headers
+                or headers.get("content-type", "").startswith(EXCLUDED_CONTENT_TYPES)
+                or message["status"] in (204, 304)
+            )
+            return
+        if message["type"] != "http.response.body":
+            await self.send(message)
+            return
+
+        body = message.get("body", b"")
+        more_body = message.get("more_body", False)
+
+        if not self.started:
+            self.started = True
+            headers = MutableHeaders(raw=self.initial_message["headers"])
+            if not self.passthrough:
+                headers.add_vary_header("Accept-Encoding")
+            if self.passthrough or (len(body) < self.minimum_size and not more_body):
+                self.passthrough = True
+                await self.send(self.initial_message)
+                await self.send(message)
+                return
+            self.compressor = COMPRESSORS[self.encoding]()
+            headers["Content-Encoding"] = self.encoding
+            if more_body:
+                del headers["Content-Length"]
+            message["body"] = self.compressor.compress(body, final=not more_body)
+            if not more_body:
+                headers["Content-Length"] = str(len(message["body"]))
+            await self.send(self.initial_message)
+            await self.send(message)
+            return
+
+        if not self.passthrough:
+            message["body"] = self.compressor.compress(body, final=not more_body)
+        await self.send(message)
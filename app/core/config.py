@@ -1,4 +1,5 @@
 import os
+import tempfile
 from pydantic_settings import BaseSettings
 from dotenv import load_dotenv
 
@@ -13,6 +14,60 @@ class Settings(BaseSettings):
     JWT_SECRET_KEY: str = os.getenv("JWT_SECRET_KEY", "your_strong_secret_key")
     ALGORITHM: str = os.getenv("ALGORITHM", "HS256")
     ACCESS_TOKEN_EXPIRE_MINUTES: int = int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES", "30"))
+    # Verified-token cache size (0 disables caching)
+    JWT_CACHE_MAX_SIZE: int = int(os.getenv("JWT_CACHE_MAX_SIZE", "10000"))
+    # Optional JWKS endpoint for asymmetric algorithms (RS256, ES256, ...); ignored for HS*
+    JWKS_URL: str = os.getenv("JWKS_URL", "")
+    JWKS_REFRESH_SECONDS: int = int(os.getenv("JWKS_REFRESH_SECONDS", "300"))
+    # Cache shared by the chat pipeline: "memory" (per process) or "file" (shared by all workers on the node)
+    CACHE_BACKEND: str = os.getenv("CACHE_BACKEND", "memory")
+    CACHE_DIR: str = os.getenv(
+        "CACHE_DIR",
+        os.path.join("/dev/shm" if os.path.isdir("/dev/shm") else tempfile.gettempdir(), "chat_microservice_cache")
+    )
+    SCHEMA_SNAPSHOT_TTL_SECONDS: int = int(os.getenv("SCHEMA_SNAPSHOT_TTL_SECONDS", "3600"))
+    ANSWER_CACHE_TTL_SECONDS: int = int(os.getenv("ANSWER_CACHE_TTL_SECONDS", "300"))
+    # Admission control for the chat endpoint (limits apply per worker process)
+    ADMISSION_MAX_CONCURRENT: int = int(os.getenv("ADMISSION_MAX_CONCURRENT", "16"))
+    ADMISSION_MAX_PER_USER: int = int(os.getenv("ADMISSION_MAX_PER_USER", "4"))
+    ADMISSION_PRIORITY_SLOTS: int = int(os.getenv("ADMISSION_PRIORITY_SLOTS", "4"))
+    ADMISSION_MAX_QUEUED: int = int(os.getenv("ADMISSION_MAX_QUEUED", "64"))
+    ADMISSION_QUEUE_TIMEOUT_SECONDS: float = float(os.getenv("ADMISSION_QUEUE_TIMEOUT_SECONDS", "15"))
+    # Comma-separated user IDs allowed to use the admin endpoints (tokens with is_staff/is_superuser are also admins)
+    ADMIN_USER_IDS: str = os.getenv("ADMIN_USER_IDS", "")
+    # Background ingestion jobs (per worker process)
+    INGEST_MAX_CONCURRENT_JOBS: int = int(os.getenv("INGEST_MAX_CONCURRENT_JOBS", "1"))
+    INGEST_BATCH_SIZE: int = int(os.getenv("INGEST_BATCH_SIZE", "500"))
+    # SQL generation: model, few-shot example selection ("lexical" or "embedding") and prompt token budget
+    SQL_MODEL: str = os.getenv("SQL_MODEL", "gpt-3.5-turbo")
+    SQL_EXAMPLE_SELECTOR: str = os.getenv("SQL_EXAMPLE_SELECTOR", "lexical")
+    SQL_PROMPT_MAX_EXAMPLES: int = int(os.getenv("SQL_PROMPT_MAX_EXAMPLES", "4"))
+    SQL_PROMPT_TOKEN_BUDGET: int = int(os.getenv("SQL_PROMPT_TOKEN_BUDGET", "2500"))
+    # Tables available to Text-to-SQL: comma-separated names, or "*" for every table and view in the database's
+    # default schema except those matching TEXT_TO_SQL_EXCLUDE_TABLES (comma-separated glob patterns).
+    # "*" exposes tables to LLM-generated SQL: on a database shared with Django, list the tables instead.
+    # Only the tables most relevant to each question are described in the prompt (see schema_catalog_service).
+    TEXT_TO_SQL_TABLES: str = os.getenv("TEXT_TO_SQL_TABLES", "data_orders")
+    TEXT_TO_SQL_EXCLUDE_TABLES: str = os.getenv(
+        "TEXT_TO_SQL_EXCLUDE_TABLES", "auth_*,django_*,authtoken_*,token_blacklist_*,account_*,socialaccount_*"
+    )
+    SCHEMA_CATALOG_SELECTOR: str = os.getenv("SCHEMA_CATALOG_SELECTOR", "lexical")
+    SCHEMA_PROMPT_MAX_TABLES: int = int(os.getenv("SCHEMA_PROMPT_MAX_TABLES", "3"))
+    SCHEMA_SAMPLE_ROWS: int = int(os.getenv("SCHEMA_SAMPLE_ROWS", "3"))
+    # Opt-in request profiling (per worker process). Admins can also profile a request with the X-Profile header.
+    PROFILING_SAMPLE_RATE: float = float(os.getenv("PROFILING_SAMPLE_RATE", "0"))  # Fraction of chat requests profiled
+    PROFILING_SLOW_REQUEST_SECONDS: float = float(os.getenv("PROFILING_SLOW_REQUEST_SECONDS", "10"))  # 0 disables capture
+    PROFILING_SAMPLE_INTERVAL_MS: float = float(os.getenv("PROFILING_SAMPLE_INTERVAL_MS", "5"))
+    PROFILING_LOOP_BLOCK_MS: float = float(os.getenv("PROFILING_LOOP_BLOCK_MS", "100"))  # 0 disables the monitor
+    PROFILING_MAX_RESULTS: int = int(os.getenv("PROFILING_MAX_RESULTS", "50"))
+    # Full-result exports: rows fetched per server-side cursor batch, export ID lifetime and concurrency (per worker)
+    EXPORT_BATCH_SIZE: int = int(os.getenv("EXPORT_BATCH_SIZE", "5000"))
+    EXPORT_TTL_SECONDS: int = int(os.getenv("EXPORT_TTL_SECONDS", "3600"))
+    EXPORT_MAX_CONCURRENT: int = int(os.getenv("EXPORT_MAX_CONCURRENT", "4"))
+    # Responses smaller than this (bytes) are not compressed
+    COMPRESSION_MINIMUM_SIZE: int = int(os.getenv("COMPRESSION_MINIMUM_SIZE", "1024"))
+    # How long a worker reuses the data version of a table (used for ETags and answer cache validation)
+    DATA_VERSION_TTL_SECONDS: float = float(os.getenv("DATA_VERSION_TTL_SECONDS", "10"))
 
     class Config:
         case_sensitive = True
@@ -0,0 +1,453 @@
+import asyncio
+import cProfile
+import io
+import pstats
+import random
+import sys
+import threading
+import time
+import uuid
+from collections import Counter, OrderedDict, deque
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+from typing import Any, Deque, Dict, List, Optional, Tuple
+
+from app.core.cache import get_shared_cache
+from app.core.config import settings
+
+# Opt-in profiling of chat requests (all state is per worker process):
+# - Stage timings are recorded for every request (a few perf_counter calls).
+# - A request is profiled when an admin sends "X-Profile: sample|cprofile", when it is picked
+#   by PROFILING_SAMPLE_RATE, or automatically when it runs longer than half of
+#   PROFILING_SLOW_REQUEST_SECONDS (and is kept only if it exceeds the full threshold).
+# - A monitor thread records event-loop blocks longer than PROFILING_LOOP_BLOCK_MS, with the
+#   stack that was blocking.
+# The sampling profiler is async-aware: for each sample it records where the request's
+# tasks are running or awaiting, so wall-clock time spent in LLM and database calls shows up.
+# Stacks are kept in collapsed format ("frame;frame;frame count"), which flamegraph.pl and
+# speedscope read directly.
+
+PROFILE_MODES = ("sample", "cprofile")
+PROFILE_TTL_SECONDS = 24 * 3600
+MAX_ACTIVE_SAMPLERS = 2
+MAX_LOOP_BLOCKS_KEPT = 200
+CPROFILE_TOP_FUNCTIONS = 40
+
+_current_profile: ContextVar[Optional["RequestProfile"]] = ContextVar("current_profile", default=None)
+
+def _frame_label(frame) -> str:
+    label = f"{frame.f_globals.get('__name__', '?')}:{frame.f_code.co_name}"
+    return label.replace(";", ":").replace(" ", "_")
+
+def _await_chain(coro) -> List[Any]:
+    """Frames of a coroutine and of everything it is awaiting, outermost first."""
+    frames = []
+    while coro is not None:
+        frame = getattr(coro, "cr_frame", None) or getattr(coro, "gi_frame", None) or getattr(coro, "ag_frame", None)
+        if frame is None:
+            break
+        frames.append(frame)
+        coro = getattr(coro, "cr_await", None) or getattr(coro, "gi_yieldfrom", None) or getattr(coro, "ag_await", None)
+    return frames
+
+def _thread_stack(thread_id: int) -> List[Any]:
+    """Frames the thread is executing, outermost first."""
+    frame = sys._current_frames().get(thread_id)
+    stack = []
+    while frame is not None:
+        stack.append(frame)
+        frame = frame.f_back
+    stack.reverse()
+    return stack
+
+def _loop_is_idle(thread_stack: List[Any]) -> bool:
+    if not thread_stack:
+        return True
+    leaf = thread_stack[-1]
+    return leaf.f_globals.get("__name__") == "selectors" or leaf.f_code.co_name in ("run_forever", "run_until_complete")
+
+class RequestProfile:
+    """Timings (and, when profiled, stack samples or cProfile stats) of one request."""
+
+    def __init__(self, name: str, mode: Optional[str], trigger: str):
+        self.id: Optional[str] = None  # Assigned when the profile is stored
+        self.name = name
+        self.mode = mode
+        self.trigger = trigger  # "header", "sampling" or "slow"
+        self.started_at = time.time()
+        self._start = time.perf_counter()
+        self.duration: Optional[float] = None
+        self.stages: List[Tuple[str, float, float]] = []  # (name, start, end) perf_counter values
+        self.samples: Counter = Counter()
+        self.sampling_started_ms: Optional[float] = None
+        self.cprofile_stats: Optional[str] = None
+        self.loop_blocks: List[Dict[str, Any]] = []
+        # Tasks spawned while this profile was current (e.g. LangChain branches), plus shared
+        # coalesced tasks this request waited on (see attach_shared_task)
+        self.task: Optional[asyncio.Task] = None
+        self.tasks: List[asyncio.Task] = []
+        self.coalesced: List[Dict[str, Any]] = []  # Shared work this request joined instead of running it
+        self.coalesced_waiters = 0  # Other requests that joined work started by this one
+        self.root_code = None
+        self.stored = False
+        self._sampler: Optional["_StackSampler"] = None
+
+    def add_stage(self, name: str, start: float, end: float):
+        self.stages.append((name, start, end))
+
+    def collapsed_stacks(self) -> str:
+        return "\n".join(f"{stack} {count}" for stack, count in self.samples.most_common())
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "id": self.id,
+            "name": self.name,
+            "mode": self.mode,
+            "trigger": self.trigger,
+            "started_at": self.started_at,
+            "duration_ms": round(self.duration * 1000, 2) if self.duration is not None else None,
+            "stages": [
+                {"name": name, "offset_ms": round((start - self._start) * 1000, 2), "duration_ms": round((end - start) * 1000, 2)}
+                for name, start, end in self.stages
+            ],
+            "sample_count": sum(self.samples.values()),
+            "sampling_started_ms": self.sampling_started_ms,
+            "collapsed_stacks": self.collapsed_stacks(),
+            "cprofile_stats": self.cprofile_stats,
+            "loop_blocks": self.loop_blocks,
+            "coalesced": self.coalesced,
+            "coalesced_waiters": self.coalesced_waiters,
+        }
+
+class stage:
+    """
+    Times a stage of the current request (`with stage("sql_generation"): ...`); does nothing
+    outside a request profile. A plain class rather than @contextmanager: it runs on every request.
+    """
+    __slots__ = ("name", "profile", "start")
+
+    def __init__(self, name: str):
+        self.name = name
+
+    def __enter__(self):
+        self.profile = _current_profile.get()
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        if self.profile is not None:
+            self.profile.stages.append((self.name, self.start, time.perf_counter()))
+        return False
+
+def current_profile() -> Optional[RequestProfile]:
+    return _current_profile.get()
+
+def attach_shared_task(task: asyncio.Future, flight: str, leader: Optional[RequestProfile]):
+    """
+    Attributes a shared (coalesced) task to the current request too. Tasks are otherwise
+    attributed to the request that created them, so a request joining in-flight work would
+    only show the await on it. The shared task is sampled as part of this request, and the
+    profile records which request's profile (`leader`, if it gets stored) has its stages.
+    """
+    profile = _current_profile.get()
+    if profile is None or profile is leader:
+        return
+    profile.tasks.append(task)
+    leader_id = None
+    if leader is not None:
+        leader.id = leader.id or _new_profile_id()
+        leader.coalesced_waiters += 1
+        leader_id = leader.id
+    profile.coalesced.append({"flight": flight, "leader_profile_id": leader_id})
+
+class _StackSampler(threading.Thread):
+    """Samples, from a separate thread, where the profiled request is running or waiting."""
+
+    def __init__(self, profile: RequestProfile, loop_thread_id: int):
+        super().__init__(name=f"profiler-{profile.name}", daemon=True)
+        self.profile = profile
+        self.loop_thread_id = loop_thread_id
+        self.interval = settings.PROFILING_SAMPLE_INTERVAL_MS / 1000
+        self._stop_event = threading.Event()
+
+    def run(self):
+        while not self._stop_event.wait(self.interval):
+            try:
+                self._sample()
+            except Exception:
+                # Running coroutines are read without locks; an inconsistent read only loses this sample
+                pass
+
+    def stop(self):
+        self._stop_event.set()
+        self.join(timeout=1)
+
+    def _labels(self, frames: List[Any]) -> List[str]:
+        # Frames above the function that opened the profile (server, middleware) are left out
+        for i, frame in enumerate(frames):
+            if frame.f_code is self.profile.root_code:
+                frames = frames[i:]
+                break
+        return [_frame_label(frame) for frame in frames]
+
+    def _sample(self):
+        profile = self.profile
+        tasks = [task for task in [profile.task, *profile.tasks] if task is not None and not task.done()]
+        if not tasks:
+            return
+        thread_stack = _thread_stack(self.loop_thread_id)
+        on_thread = set(map(id, thread_stack))
+        root_chain = _await_chain(profile.task.get_coro()) if profile.task is not None else []
+
+        # Running on the event loop: record the full stack, including synchronous calls
+        for task in reversed(tasks):
+            chain = _await_chain(task.get_coro())
+            if chain and id(chain[-1]) in on_thread:
+                start = next(i for i, frame in enumerate(thread_stack) if frame is chain[0]) if id(chain[0]) in on_thread else 0
+                prefix = self._labels(root_chain) + ["(task)"] if task is not profile.task else []
+                profile.samples[";".join(prefix + self._labels(thread_stack[start:]))] += 1
+                return
+
+        # Waiting: record where the most recent task awaits, and whether the loop is busy with other work
+        task = tasks[-1]
+        labels = self._labels(root_chain)
+        if task is not profile.task:
+            labels += ["(task)"] + self._labels(_await_chain(task.get_coro()))
+        if _loop_is_idle(thread_stack):
+            labels.append("(waiting)")
+        else:
+            labels.append(f"(loop_busy:{_frame_label(thread_stack[-1])})")
+        profile.samples[";".join(labels)] += 1
+
+_active_samplers = 0
+_cprofile_active = False
+
+def _start_sampler(profile: RequestProfile) -> bool:
+    global _active_samplers
+    if profile._sampler is not None or _active_samplers >= MAX_ACTIVE_SAMPLERS:
+        return False
+    _active_samplers += 1
+    profile.sampling_started_ms = round((time.perf_counter() - profile._start) * 1000, 2)
+    profile._sampler = _StackSampler(profile, threading.get_ident())
+    profile._sampler.start()
+    return True
+
+def _stop_sampler(profile: RequestProfile):
+    global _active_samplers
+    if profile._sampler is not None:
+        profile._sampler.stop()
+        profile._sampler = None
+        _active_samplers -= 1
+
+def requested_profile_mode(header_value: Optional[str], allowed: bool) -> Tuple[Optional[str], str]:
+    """
+    Decides how a request is profiled: the X-Profile header (honored for admins only), then
+    PROFILING_SAMPLE_RATE. Returns (mode, trigger); mode None means only slow-request capture.
+    """
+    if header_value and allowed:
+        mode = header_value.strip().lower()
+        return (mode if mode in PROFILE_MODES else "sample"), "header"
+    if settings.PROFILING_SAMPLE_RATE > 0 and random.random() < settings.PROFILING_SAMPLE_RATE:
+        return "sample", "sampling"
+    return None, "slow"
+
+@asynccontextmanager
+async def profile_request(name: str, mode: Optional[str] = None, trigger: str = "slow"):
+    """
+    Records the stage timings of the block and profiles it as requested (see requested_profile_mode).
+    Yields the RequestProfile; its result is stored if the block was profiled or turned out slow.
+    """
+    global _cprofile_active
+    profile = RequestProfile(name, mode, trigger)
+    profile.task = asyncio.current_task()
+    # The function that entered this context manager (two frames up, past contextlib's __aenter__):
+    # sampled stacks start there
+    aenter_frame = sys._getframe(0).f_back
+    if aenter_frame is not None and aenter_frame.f_back is not None:
+        profile.root_code = aenter_frame.f_back.f_code
+    token = _current_profile.set(profile)
+
+    slow_after = settings.PROFILING_SLOW_REQUEST_SECONDS
+    timer = None
+    profiler: Optional[cProfile.Profile] = None
+    if mode == "cprofile" and not _cprofile_active:
+        # cProfile sees everything running on the event loop thread, including other requests
+        _cprofile_active = True
+        profiler = cProfile.Profile()
+        profiler.enable()
+    elif mode is not None:
+        profile.mode = "sample"
+        _start_sampler(profile)
+    elif slow_after > 0:
+        # Sampling starts halfway to the threshold, so a slow request has its slow part captured
+        timer = asyncio.get_running_loop().call_later(slow_after / 2, _start_sampler, profile)
+
+    try:
+        yield profile
+    finally:
+        profile.duration = time.perf_counter() - profile._start
+        if timer is not None:
+            timer.cancel()
+        _stop_sampler(profile)
+        if profiler is not None:
+            profiler.disable()
+            _cprofile_active = False
+            output = io.StringIO()
+            pstats.Stats(profiler, stream=output).sort_stats("cumulative").print_stats(CPROFILE_TOP_FUNCTIONS)
+            profile.cprofile_stats = output.getvalue()
+        _current_profile.reset(token)
+        profile.tasks = []
+
+        if mode is not None or (slow_after > 0 and profile.duration >= slow_after):
+            if mode is None:
+                profile.mode = "sample" if profile.samples else None
+            await _store_profile(profile)
+
+# --- Results ---
+
+_results: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+
+def _new_profile_id() -> str:
+    return uuid.uuid4().hex[:16]
+
+def _profile_key(profile_id: str) -> str:
+    return f"profile:{profile_id}"
+
+async def _store_profile(profile: RequestProfile):
+    if _loop_monitor is not None:
+        end = profile.started_at + profile.duration
+        profile.loop_blocks = [block for block in _loop_monitor.blocks if profile.started_at <= block["at"] <= end]
+    # The ID may already be set if another request joined work started by this one
+    profile.id = profile.id or _new_profile_id()
+    result = profile.to_dict()
+    profile.stored = True
+    _results[profile.id] = result
+    while len(_results) > settings.PROFILING_MAX_RESULTS:
+        _results.popitem(last=False)
+    # Published so the result can be fetched from any worker
+    await get_shared_cache().set(_profile_key(profile.id), result, ttl_seconds=PROFILE_TTL_SECONDS)
+    print(f"Profile {profile.id} stored ({profile.trigger}): {profile.name} took {result['duration_ms']:.0f} ms")
+
+def list_profiles() -> List[Dict[str, Any]]:
+    """Summaries of this worker's stored profiles, most recent first."""
+    return [
+        {
+            key: value for key, value in result.items()
+            if key not in ("collapsed_stacks", "cprofile_stats", "stages", "loop_blocks", "coalesced")
+        }
+        for result in reversed(_results.values())
+    ]
+
+async def get_profile(profile_id: str) -> Optional[Dict[str, Any]]:
+    result = _results.get(profile_id)
+    if result is not None:
+        return result
+    return await get_shared_cache().get(_profile_key(profile_id))
+
+# --- Event loop block monitor ---
+
+class LoopBlockMonitor(threading.Thread):
+    """
+    Detects event-loop blocks: a heartbeat callback is scheduled on the loop and, when it runs
+    later than the threshold, a block is recorded with the stack the loop thread was stuck in.
+    """
+
+    def __init__(self, loop: asyncio.AbstractEventLoop, threshold: float):
+        super().__init__(name="loop-block-monitor", daemon=True)
+        self.loop = loop
+        self.loop_thread_id = threading.get_ident()
+        self.threshold = threshold
+        self.interval = max(threshold / 2, 0.01)
+        self.blocks: Deque[Dict[str, Any]] = deque(maxlen=MAX_LOOP_BLOCKS_KEPT)
+        self.block_count = 0
+        self.total_blocked_seconds = 0.0
+        self.max_block_seconds = 0.0
+        self._stop_event = threading.Event()
+        self._scheduled_at: Optional[float] = None
+        self._ran_at: Optional[float] = None
+
+    def _beat(self):
+        self._ran_at = time.monotonic()
+
+    def run(self):
+        blocking_stack = None
+        while not self._stop_event.wait(self.interval):
+            if self._scheduled_at is not None and self._ran_at is None:
+                # Heartbeat still pending: capture what the loop is stuck in, once per block
+                if blocking_stack is None and time.monotonic() - self._scheduled_at >= self.threshold:
+                    blocking_stack = ";".join(_frame_label(frame) for frame in _thread_stack(self.loop_thread_id))
+                continue
+            if self._scheduled_at is not None:
+                lag = self._ran_at - self._scheduled_at
+                if lag >= self.threshold:
+                    self._record(lag, blocking_stack)
+            blocking_stack = None
+            self._ran_at = None
+            self._scheduled_at = time.monotonic()
+            try:
+                self.loop.call_soon_threadsafe(self._beat)
+            except RuntimeError:
+                return  # Loop closed
+
+    def _record(self, lag: float, stack: Optional[str]):
+        self.block_count += 1
+        self.total_blocked_seconds += lag
+        self.max_block_seconds = max(self.max_block_seconds, lag)
+        self.blocks.append({
+            "at": time.time() - (time.monotonic() - self._scheduled_at),
+            "duration_ms": round(lag * 1000, 1),
+            "stack": stack,
+        })
+
+    def stop(self):
+        self._stop_event.set()
+        self.join(timeout=1)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "threshold_ms": self.threshold * 1000,
+            "blocks": self.block_count,
+            "total_blocked_ms": round(self.total_blocked_seconds * 1000, 1),
+            "max_block_ms": round(self.max_block_seconds * 1000, 1),
+            "recent": list(self.blocks)[-20:],
+        }
+
+_loop_monitor: Optional[LoopBlockMonitor] = None
+_previous_task_factory = None
+
+def _task_factory(loop, coro, **kwargs):
+    # Tasks created while a request profile is current are attributed to that request
+    if _previous_task_factory is not None:
+        task = _previous_task_factory(loop, coro, **kwargs)
+    else:
+        task = asyncio.Task(coro, loop=loop, **kwargs)
+    profile = _current_profile.get()
+    if profile is not None:
+        profile.tasks.append(task)
+    return task
+
+def start_profiling():
+    """Installs the task factory and starts the loop block monitor; called once per worker at startup."""
+    global _loop_monitor, _previous_task_factory
+    loop = asyncio.get_running_loop()
+    if loop.get_task_factory() is not _task_factory:
+        _previous_task_factory = loop.get_task_factory()
+        loop.set_task_factory(_task_factory)
+    if settings.PROFILING_LOOP_BLOCK_MS > 0 and _loop_monitor is None:
+        _loop_monitor = LoopBlockMonitor(loop, settings.PROFILING_LOOP_BLOCK_MS / 1000)
+        _loop_monitor.start()
+
+def stop_profiling():
+    global _loop_monitor
+    if _loop_monitor is not None:
+        _loop_monitor.stop()
+        _loop_monitor = None
+
+def get_profiling_stats() -> Dict[str, Any]:
+    return {
+        "stored_profiles": len(_results),
+        "active_samplers": _active_samplers,
+        "sample_rate": settings.PROFILING_SAMPLE_RATE,
+        "slow_request_seconds": settings.PROFILING_SLOW_REQUEST_SECONDS,
+        "event_loop": _loop_monitor.stats() if _loop_monitor is not None else None,
+    }
@@ -1,9 +1,14 @@
-from datetime import datetime, timedelta, timezone
-from typing import Optional
+import asyncio
+import hashlib
+import time
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
 
+import httpx
 from fastapi import Depends, HTTPException, status
 from fastapi.security import APIKeyHeader
-from jose import JWTError, jwt
+from jose import ExpiredSignatureError, JWTError, jwk, jwt
+from jose.backends.base import Key
 from pydantic import BaseModel
 
 from app.core.config import settings
@@ -13,6 +18,111 @@ api_key_scheme = APIKeyHeader(name="Authorization", auto_error=True)
 class TokenData(BaseModel):
     username: Optional[str] = None
 
+# Verified tokens, keyed by the SHA-256 of the raw token: (payload, exp timestamp).
+# Ordered by recency of use so the least recently used token is evicted first.
+_verified_token_cache: "OrderedDict[str, Tuple[dict, float]]" = OrderedDict()
+
+# Signing keys are built once instead of on every request.
+# HS* algorithms use the shared secret; asymmetric algorithms use the keys published
+# at JWKS_URL, indexed by their "kid".
+_shared_secret_key: Optional[Key] = None
+_jwks_keys: Dict[str, Key] = {}
+_jwks_refresh_task: Optional[asyncio.Task] = None
+
+def _uses_jwks() -> bool:
+    return bool(settings.JWKS_URL) and not settings.ALGORITHM.upper().startswith("HS")
+
+def _get_shared_secret_key() -> Key:
+    global _shared_secret_key
+    if _shared_secret_key is None:
+        if not settings.ALGORITHM.upper().startswith("HS"):
+            # JWT_SECRET_KEY is a shared secret, not a public key
+            raise ValueError(f"ALGORITHM '{settings.ALGORITHM}' is asymmetric: JWKS_URL must be set to verify tokens.")
+        _shared_secret_key = jwk.construct(settings.JWT_SECRET_KEY, settings.ALGORITHM)
+    return _shared_secret_key
+
+def _build_jwks_keys(jwks: dict) -> Dict[str, Key]:
+    keys = {}
+    for key_data in jwks.get("keys", []):
+        if key_data.get("use", "sig") != "sig":
+            continue
+        keys[key_data.get("kid", "")] = jwk.construct(key_data, key_data.get("alg", settings.ALGORITHM))
+    return keys
+
+async def refresh_signing_keys():
+    """
+    Fetches the JWKS document and replaces the preloaded asymmetric keys.
+    If the set of key IDs changed (rotation or revocation), cached verifications are dropped.
+    """
+    global _jwks_keys
+    async with httpx.AsyncClient(timeout=10) as client:
+        response = await client.get(settings.JWKS_URL)
+        response.raise_for_status()
+    new_keys = _build_jwks_keys(response.json())
+    if set(new_keys) != set(_jwks_keys):
+        _verified_token_cache.clear()
+    _jwks_keys = new_keys
+
+async def _refresh_signing_keys_periodically():
+    while True:
+        await asyncio.sleep(settings.JWKS_REFRESH_SECONDS)
+        try:
+            await refresh_signing_keys()
+        except Exception as e:
+            # Keep serving with the previous keys; the next cycle will retry
+            print(f"Error refreshing JWKS signing keys: {e}")
+
+async def preload_signing_keys():
+    """
+    Builds the signing keys up front and, when JWKS is configured, starts the
+    background refresh. Called from the application lifespan.
+    """
+    global _jwks_refresh_task
+    if not _uses_jwks():
+        _get_shared_secret_key()
+        return
+    await refresh_signing_keys()
+    if _jwks_refresh_task is None:
+        _jwks_refresh_task = asyncio.create_task(_refresh_signing_keys_periodically())
+
+async def stop_signing_key_refresh():
+    global _jwks_refresh_task
+    if _jwks_refresh_task is not None:
+        _jwks_refresh_task.cancel()
+        _jwks_refresh_task = None
+
+def _get_verification_key(token: str) -> Key:
+    if not _uses_jwks():
+        return _get_shared_secret_key()
+    kid = jwt.get_unverified_header(token).get("kid", "")
+    key = _jwks_keys.get(kid)
+    if key is None:
+        raise JWTError(f"Unknown signing key id: {kid}")
+    return key
+
+def _get_cached_payload(token_hash: str) -> Optional[dict]:
+    cached = _verified_token_cache.get(token_hash)
+    if cached is None:
+        return None
+    payload, exp = cached
+    if exp <= time.time():
+        del _verified_token_cache[token_hash]
+        return None
+    _verified_token_cache.move_to_end(token_hash)
+    # A copy, so a request modifying its payload does not affect the others
+    return dict(payload)
+
+def _cache_payload(token_hash: str, payload: dict, exp: float):
+    if settings.JWT_CACHE_MAX_SIZE <= 0:
+        return
+    _verified_token_cache[token_hash] = (payload, exp)
+    _verified_token_cache.move_to_end(token_hash)
+    while len(_verified_token_cache) > settings.JWT_CACHE_MAX_SIZE:
+        _verified_token_cache.popitem(last=False)
+
+def clear_token_cache():
+    _verified_token_cache.clear()
+
 async def get_current_user(token_header: str = Depends(api_key_scheme)):
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
@@ -26,39 +136,60 @@ async def get_current_user(token_header: str = Depends(api_key_scheme)):
             detail="Invalid authorization header. Must be 'Bearer <token>'.",
             headers={"WWW-Authenticate": "Bearer"},
         )
-    
+
     token = token_header.split(" ", 1)[1]
 
+    # The frontend resends the same token on every request; skip signature verification
+    # for tokens already verified, as long as they have not expired since.
+    token_hash = hashlib.sha256(token.encode()).hexdigest()
+    payload = _get_cached_payload(token_hash)
+    if payload is not None:
+        return payload
+
     try:
+        # jose verifies "exp" itself, so an expired token raises ExpiredSignatureError here
         payload = jwt.decode(
             token,
-            settings.JWT_SECRET_KEY,
+            _get_verification_key(token),
             algorithms=[settings.ALGORITHM]
         )
-        username: Optional[str] = payload.get("user_id")
-        if username is None:
-            username = payload.get("sub")
-            if username is None:
-                raise credentials_exception
-        
-        exp = payload.get("exp")
-        if exp is None:
-            raise HTTPException(
-                status_code=status.HTTP_401_UNAUTHORIZED,
-                detail="Token has no expiration date",
-                headers={"WWW-Authenticate": "Bearer"},
-            )
-        if datetime.fromtimestamp(exp, timezone.utc) < datetime.now(timezone.utc):
-            raise HTTPException(
-                status_code=status.HTTP_401_UNAUTHORIZED,
-                detail="Token has expired",
-                headers={"WWW-Authenticate": "Bearer"},
-            )
-        
-        return payload
-    except JWTError as e:
-        print(f"JWTError: {e}")
+    except ExpiredSignatureError:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Token has expired",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+    except (JWTError, ValueError):
         raise credentials_exception
-    except Exception as e:
-        print(f"Generic decoding/validation error: {e}")
+
+    if payload.get("user_id") is None and payload.get("sub") is None:
         raise credentials_exception
+
+    exp = payload.get("exp")
+    if exp is None:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Token has no expiration date",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+
+    _cache_payload(token_hash, payload, float(exp))
+    return dict(payload)
+
+def is_admin(current_user_payload: dict) -> bool:
+    """Tells whether the token belongs to an admin: a Django staff/superuser, or a user ID listed in ADMIN_USER_IDS."""
+    user_id = current_user_payload.get("user_id") or current_user_payload.get("sub")
+    admin_ids = {admin_id.strip() for admin_id in settings.ADMIN_USER_IDS.split(",") if admin_id.strip()}
+    return bool(current_user_payload.get("is_staff") or current_user_payload.get("is_superuser") or str(user_id) in admin_ids)
+
+async def get_current_admin(current_user_payload: dict = Depends(get_current_user)):
+    """
+    Allows the request only for admin users: Django staff/superusers, or user IDs
+    listed in ADMIN_USER_IDS.
+    """
+    if is_admin(current_user_payload):
+        return current_user_payload
+    raise HTTPException(
+        status_code=status.HTTP_403_FORBIDDEN,
+        detail="Admin privileges required",
+    )
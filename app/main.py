@@ -1,18 +1,35 @@
+import os
 from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 
 from app.api.v1.api import api_router
+from app.core.compression import CompressionMiddleware
 from app.core.config import settings
+from app.core.profiling import start_profiling, stop_profiling
+from app.core.security import preload_signing_keys, stop_signing_key_refresh
+from app.db.session import engine
+from app.services.database_service import initialize_text_to_sql, shutdown_text_to_sql
+from app.services.ingestion_job_service import shutdown_ingestion_jobs
 from app.services.vector_store_service import initialize_vector_store_if_needed
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    print("Application startup: Initializing database connection...")
+    # Runs once per worker process, after the server has forked, so every worker
+    # builds its own connections instead of inheriting them from the parent.
+    print(f"Application startup (pid {os.getpid()}): Initializing database connection...")
+    # First, so blocking calls during the rest of startup are also reported
+    start_profiling()
+    await initialize_text_to_sql()
     await initialize_vector_store_if_needed()
+    await preload_signing_keys()
     print("Application startup complete.")
     yield
-    # Aquí podrías agregar lógica de shutdown si la necesitas
+    await shutdown_ingestion_jobs()
+    await stop_signing_key_refresh()
+    shutdown_text_to_sql()
+    await engine.dispose()
+    stop_profiling()
 
 app = FastAPI(
     title="Chat Microservice",
@@ -33,8 +50,12 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"], # Allows all methods (GET, POST, etc.)
     allow_headers=["*"], # Allows all headers
+    expose_headers=["ETag", "X-Profile-Id"], # ETag is sent back in If-None-Match; X-Profile-Id names a stored profile
 )
 
+# Negotiated zstd/brotli/gzip compression for responses above the size threshold
+app.add_middleware(CompressionMiddleware, minimum_size=settings.COMPRESSION_MINIMUM_SIZE)
+
 app.include_router(api_router, prefix=settings.API_V1_STR)
 
 @app.get("/")
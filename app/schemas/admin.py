@@ -0,0 +1,52 @@
+from pydantic import BaseModel
+from typing import List, Optional
+
+class IngestionJobRequest(BaseModel):
+    table_name: str = "data_orders"
+    project: Optional[str] = None
+
+class IngestionJobStatus(BaseModel):
+    id: str
+    kind: str  # "ingest" or "reindex"
+    table_name: str
+    project: Optional[str] = None
+    status: str  # "queued", "running", "completed", "failed" or "cancelled"
+    total_rows: Optional[int] = None
+    processed_rows: int = 0
+    progress: Optional[float] = None  # Fraction between 0 and 1, when the total is known
+    error: Optional[str] = None
+    created_at: float
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+
+class ProfileStage(BaseModel):
+    name: str
+    offset_ms: float  # From the start of the request
+    duration_ms: float
+
+class LoopBlock(BaseModel):
+    at: float
+    duration_ms: float
+    stack: Optional[str] = None  # Collapsed stack the event loop was stuck in
+
+class ProfileSummary(BaseModel):
+    id: str
+    name: str
+    mode: Optional[str] = None  # "sample", "cprofile", or None (stage timings only)
+    trigger: str  # "header", "sampling" or "slow"
+    started_at: float
+    duration_ms: Optional[float] = None
+    sample_count: int = 0
+    sampling_started_ms: Optional[float] = None  # Slow-request captures start sampling mid-request
+    coalesced_waiters: int = 0  # Requests that joined work started by this one
+
+class CoalescedCall(BaseModel):
+    flight: str  # "question", "sql" or "data_version"
+    leader_profile_id: Optional[str] = None  # Profile of the request that ran the shared work, if stored
+
+class ProfileResult(ProfileSummary):
+    stages: List[ProfileStage] = []
+    collapsed_stacks: str = ""  # One "frame;frame;frame count" line per stack (flamegraph.pl, speedscope)
+    cprofile_stats: Optional[str] = None
+    loop_blocks: List[LoopBlock] = []
+    coalesced: List[CoalescedCall] = []  # Shared work this request waited on instead of running it
@@ -9,3 +9,5 @@ class ChatResponse(BaseModel):
     answer: str
     user_id: str
     json_data: Optional[Any] = None
+    # Set when json_data comes from a generated query; use it with GET /chat/export/{export_id} for the full result
+    export_id: Optional[str] = None
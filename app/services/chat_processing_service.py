@@ -1,37 +1,142 @@
+import hashlib
 import re
 from typing import Optional, Any, Tuple
-from sqlalchemy.ext.asyncio import AsyncSession
-from app.services.database_service import get_answer_from_table_via_langchain
+from app.core.cache import get_shared_cache
+from app.core.config import settings
+from app.core.profiling import stage
+from app.services.coalescing_service import normalize_question, question_flight
+from app.services.database_service import get_answer_from_table_via_langchain, get_data_version
+from app.services.export_service import register_export
 from app.services.vector_store_service import get_rag_context # Assuming this is still needed for specific cases
 
-async def process_chat_message(db: AsyncSession, message: str, user_id: str) -> Tuple[str, Optional[Any]]:
+# Regex to find order_number or shipment_number patterns
+# This pattern looks for common prefixes like "order", "shipment", "orden", "pedido"
+# followed by a colon or space, and then the number/code itself (alphanumeric, hyphens, underscores).
+# It also tries to capture numbers/codes that might be mentioned without explicit prefixes if they look like typical IDs.
+ORDER_SHIPMENT_PATTERN = re.compile(
+    r"(?:order number\b|order\b|shipment number\b|shipment\b|orden\b|pedido\b|embarque\b)[\s:]*([a-z0-9-_/]+)|\b([a-z0-9-_/]{5,})\b", 
+    re.IGNORECASE
+)
+
+def extract_specific_identifier(message: str) -> Optional[str]:
+    """Returns the order/shipment identifier mentioned in the message, if any."""
+    match = ORDER_SHIPMENT_PATTERN.search(message.lower()) # Normalize for easier matching
+    if not match:
+        return None
+    # Only consider group 1 (explicitly prefixed identifiers) for the RAG path.
+    # Group 2 (standalone alphanumeric sequences) was too general and incorrectly captured common words.
+    return match.group(1)
+
+def answer_cache_key(message: str) -> str:
+    """Builds the shared-cache key under which the answer to a question is stored."""
+    return "answer:" + hashlib.sha256(normalize_question(message).encode()).hexdigest()
+
+def _answer_marker_key(cache_key: str) -> str:
+    return f"{cache_key}:marker"
+
+async def get_cached_answer_marker(message: str, data_version: Optional[str]) -> Optional[dict]:
+    """
+    Returns the small marker stored next to a cached answer (its data version, export ID and
+    query) if the answer is cached for the current data version. Used to decide things about a
+    request before admission without reading the full answer, whose json_data may be large.
+    """
+    if data_version is None:
+        return None
+    marker = await get_shared_cache().get(_answer_marker_key(answer_cache_key(message)))
+    if marker is None or marker.get("data_version") != data_version:
+        return None
+    return marker
+
+async def is_cheap_request(message: str, data_version: Optional[str]) -> bool:
+    """
+    Tells whether a question can be answered without the Text-to-SQL pipeline:
+    its answer is cached for the current data version, or it is a lookup of a specific order/shipment ID.
+    """
+    # ORDER_SHIPMENT_PATTERN also captures plain words ("shipment type", "order per month");
+    # only tokens with a digit look like real IDs and get a priority slot
+    identifier = extract_specific_identifier(message)
+    if identifier and any(char.isdigit() for char in identifier):
+        return True
+    return await get_cached_answer_marker(message, data_version) is not None
+
+async def revalidate_cached_answer(message: str, data_version: Optional[str]) -> bool:
+    """
+    Tells whether a client's copy of an answer (matched by ETag) can still be used: its answer
+    must be cached for the current data version. The answer's export is registered again, so
+    the export ID the client holds keeps working for another EXPORT_TTL_SECONDS.
+    """
+    marker = await get_cached_answer_marker(message, data_version)
+    if marker is None:
+        return False
+    if marker.get("export_id") and marker.get("sql_query"):
+        # Same query, same export ID: this only refreshes its TTL
+        await register_export(marker["sql_query"])
+    return True
+
+def answer_etag(message: str, user_id: str, data_version: str) -> str:
+    """
+    Builds the (weak) ETag of a chat response: it only changes when the question's
+    answer cache key or the data version of the Text-to-SQL tables changes.
+    The user ID is included because it is echoed in the response body.
+    """
+    digest = hashlib.sha256(f"{answer_cache_key(message)}:{data_version}:{user_id}".encode()).hexdigest()
+    return f'W/"{digest[:32]}"'
+
+async def process_chat_message(message: str, user_id: str) -> Tuple[str, Optional[Any], Optional[str]]:
     """
     Processes a user's chat message.
-    1. Checks if the question is about a specific order or shipment number.
-       If so, uses RAG to fetch details for that specific entity.
-    2. Otherwise, attempts to answer the question using LangChain Text-to-SQL against the 'data_orders' table.
-    3. If LangChain cannot answer or an error occurs, a fallback message is provided.
-    Returns a natural language answer and optional JSON data.
+    Answers are first looked up in the shared cache (visible to every worker), and reused
+    only while the data version of the Text-to-SQL tables is unchanged. When the data version
+    cannot be determined, the answer cache is neither read nor written.
+    On a miss, concurrent requests asking the same (normalized) question share a single
+    in-flight answer instead of each running its own LLM calls and database query.
+    Returns the answer, optional JSON data and, when the data came from a generated query,
+    an export ID for downloading the full result.
     """
-    normalized_message = message.lower() # Normalize for easier matching
+    cache_key = answer_cache_key(message)
+    with stage("answer_cache_lookup"):
+        data_version = await get_data_version()
+        cached = await get_shared_cache().get(cache_key) if data_version is not None else None
+    # Answers computed before the data last changed are treated as a miss
+    if cached is not None and cached.get("data_version") == data_version:
+        return cached["answer"], cached["json_data"], cached.get("export_id")
 
-    # Regex to find order_number or shipment_number patterns
-    # This pattern looks for common prefixes like "order", "shipment", "orden", "pedido"
-    # followed by a colon or space, and then the number/code itself (alphanumeric, hyphens, underscores).
-    # It also tries to capture numbers/codes that might be mentioned without explicit prefixes if they look like typical IDs.
-    order_shipment_pattern = re.compile(
-        r"(?:order number\b|order\b|shipment number\b|shipment\b|orden\b|pedido\b|embarque\b)[\s:]*([a-z0-9-_/]+)|\b([a-z0-9-_/]{5,})\b", 
-        re.IGNORECASE
+    return await question_flight.do(
+        normalize_question(message), lambda: _answer_and_cache(message, cache_key, data_version)
     )
-    
-    match = order_shipment_pattern.search(normalized_message)
-    specific_identifier_found = None
 
-    if match:
-        # Prioritize the explicitly prefixed group if found
-        # Only consider group 1 (explicitly prefixed identifiers) for the RAG path.
-        # Group 2 (standalone alphanumeric sequences) was too general and incorrectly captured common words.
-        specific_identifier_found = match.group(1)
+async def _answer_and_cache(message: str, cache_key: str, data_version: Optional[str]) -> Tuple[str, Optional[Any], Optional[str]]:
+    answer, json_data, sql_query = await _answer_chat_message(message)
+    with stage("register_export"):
+        export_id = await register_export(sql_query) if sql_query and json_data is not None else None
+    # Only answers backed by query results with rows are cached; fallbacks, errors and empty
+    # results (the rows may arrive before the data version is next checked) are retried next time.
+    # Without a data version there is no way to tell when the answer goes stale.
+    if json_data and data_version is not None:
+        cache = get_shared_cache()
+        await cache.set(
+            cache_key,
+            {"answer": answer, "json_data": json_data, "export_id": export_id, "data_version": data_version},
+            ttl_seconds=settings.ANSWER_CACHE_TTL_SECONDS
+        )
+        # Written after the answer, with the same TTL, so it does not outlive it
+        await cache.set(
+            _answer_marker_key(cache_key),
+            {"data_version": data_version, "export_id": export_id, "sql_query": sql_query},
+            ttl_seconds=settings.ANSWER_CACHE_TTL_SECONDS
+        )
+    return answer, json_data, export_id
+
+async def _answer_chat_message(message: str) -> Tuple[str, Optional[Any], Optional[str]]:
+    """
+    Answers a chat message.
+    1. Checks if the question is about a specific order or shipment number.
+       If so, uses RAG to fetch details for that specific entity.
+    2. Otherwise, attempts to answer the question using LangChain Text-to-SQL against the tables of the schema catalogue.
+    3. If LangChain cannot answer or an error occurs, a fallback message is provided.
+    Returns a natural language answer, optional JSON data and the SQL query behind the data, if any.
+    """
+    specific_identifier_found = extract_specific_identifier(message)
 
     if specific_identifier_found:
         # If a specific order/shipment ID is found, use RAG to get its details.
@@ -54,38 +159,37 @@ async def process_chat_message(db: AsyncSession, message: str, user_id: str) ->
         
         try:
             # Using k=1 because we are looking for a very specific document.
-            rag_context_str = await get_rag_context(query=rag_query, k=1, filter=rag_filter)
+            with stage("rag_lookup"):
+                rag_context_str = await get_rag_context(query=rag_query, k=1, filter=rag_filter)
 
             if rag_context_str and "No relevant documents found" not in rag_context_str:
                 # If RAG provides context, format it as an answer.
                 # For now, we return the direct RAG context. You might want to process this further.
                 # Also, RAG typically returns text; creating structured JSON from it might require additional parsing or LLM calls.
                 # For simplicity, we'll return the text and no specific JSON for RAG results here.
-                return f"Details for {specific_identifier_found}:\n{rag_context_str}", None
+                return f"Details for {specific_identifier_found}:\n{rag_context_str}", None, None
             else:
                 # If RAG doesn't find it, we can still try Langchain or inform the user.
                 # For now, let's inform the user and not proceed to Langchain for this specific ID case.
-                return f"I couldn't find specific details for order/shipment '{specific_identifier_found}'. If this is not an ID, please ask your question more generally.", None
+                return f"I couldn't find specific details for order/shipment '{specific_identifier_found}'. If this is not an ID, please ask your question more generally.", None, None
         except Exception as e:
             print(f"Error during RAG lookup for {specific_identifier_found}: {e}")
-            return "I encountered an error while looking up the specific order/shipment details. Please try again.", None
+            return "I encountered an error while looking up the specific order/shipment details. Please try again.", None, None
 
     # If no specific order/shipment ID is detected, or RAG failed to find it and we decide to proceed:
-    # Use LangChain Text-to-SQL for the 'data_orders' table.
+    # Use LangChain Text-to-SQL over the tables relevant to the question.
     try:
-        nl_answer, json_data = await get_answer_from_table_via_langchain(
-            db_session=db, 
-            question=message,  # Use original message for Langchain for better context
-            table_name="data_orders"
+        nl_answer, json_data, sql_query = await get_answer_from_table_via_langchain(
+            question=message  # Use original message for Langchain for better context
         )
         
         # If nl_answer is empty or indicates no data, provide a helpful response.
         if not nl_answer or "could not find" in nl_answer.lower() or "don't know" in nl_answer.lower():
-            return "I couldn't find the information in the 'data_orders' table. We are still under development for accessing other data sources.", json_data
+            return "I couldn't find the information in the available tables. We are still under development for accessing other data sources.", json_data, sql_query
             
-        return nl_answer, json_data
+        return nl_answer, json_data, sql_query
     
     except Exception as e:
         print(f"Error in LangChain processing: {e}")
         # Fallback message if LangChain fails
-        return "I am having trouble accessing the database at the moment. We are still under development for some information requests. Please try again later or ask a different question.", None
+        return "I am having trouble accessing the database at the moment. We are still under development for some information requests. Please try again later or ask a different question.", None, None
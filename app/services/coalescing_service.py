@@ -0,0 +1,95 @@
+import asyncio
+import re
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional, TypeVar
+
+from app.core.profiling import RequestProfile, attach_shared_task, current_profile, stage
+
+T = TypeVar("T")
+
+
+class _InFlightCall:
+    """A shared task plus the number of callers currently waiting on it."""
+
+    def __init__(self, task: asyncio.Future, profile: Optional[RequestProfile]):
+        self.task = task
+        self.waiters = 0
+        self.profile = profile  # Profile of the request that started the task (its stages are recorded there)
+
+
+class SingleFlight:
+    """
+    Deduplicates concurrent calls that share the same key.
+    The first caller for a key starts the work as a task; callers arriving while it is
+    still running await the same task and receive its result (or its exception).
+    A caller being cancelled never cancels the shared task for the others; the task is
+    only cancelled once every waiter is gone.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self._calls: Dict[Hashable, _InFlightCall] = {}
+        self.executed_calls = 0
+        self.coalesced_calls = 0
+
+    async def do(self, key: Hashable, func: Callable[[], Awaitable[T]]) -> T:
+        call = self._calls.get(key)
+        coalesced = call is not None
+        if call is None:
+            call = _InFlightCall(asyncio.ensure_future(func()), current_profile())
+            self._calls[key] = call
+            call.task.add_done_callback(lambda _task, key=key, call=call: self._forget(key, call))
+            self.executed_calls += 1
+        else:
+            self.coalesced_calls += 1
+            attach_shared_task(call.task, self.name, call.profile)
+
+        call.waiters += 1
+        try:
+            # shield() keeps this caller's cancellation from propagating into the shared task
+            if coalesced:
+                with stage(f"coalesced_wait:{self.name}"):
+                    return await asyncio.shield(call.task)
+            return await asyncio.shield(call.task)
+        finally:
+            call.waiters -= 1
+            if call.waiters == 0 and not call.task.done():
+                # Nobody is interested in the result anymore; stop the work and make sure
+                # a new caller for the same key starts fresh instead of joining a dying task.
+                self._forget(key, call)
+                call.task.cancel()
+
+    def _forget(self, key: Hashable, call: _InFlightCall):
+        if self._calls.get(key) is call:
+            del self._calls[key]
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "in_flight": len(self._calls),
+            "executed_calls": self.executed_calls,
+            "coalesced_calls": self.coalesced_calls,
+        }
+
+
+def normalize_question(message: str) -> str:
+    """
+    Builds the coalescing key for a chat question: case, surrounding/repeated whitespace
+    and trailing punctuation do not change the answer, so they are ignored.
+    """
+    normalized = re.sub(r"\s+", " ", message.strip().lower())
+    return normalized.rstrip("?!. ")
+
+
+# Shared instances: one for whole chat questions, one for generated SQL statements, and one
+# for data version refreshes (run by every chat request when the per-worker version expires)
+question_flight = SingleFlight("question")
+sql_flight = SingleFlight("sql")
+data_version_flight = SingleFlight("data_version")
+
+
+def get_coalescing_stats() -> Dict[str, Dict[str, Any]]:
+    """Returns how many calls were executed and how many joined an in-flight call."""
+    return {
+        question_flight.name: question_flight.stats(),
+        sql_flight.name: sql_flight.stats(),
+        data_version_flight.name: data_version_flight.stats(),
+    }
@@ -1,14 +1,27 @@
 from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import create_engine
+from sqlalchemy.engine import Engine
 from sqlalchemy.sql import text
+import asyncio
+import hashlib
 import re
+import time
 import json  # Add json import
-from typing import Optional, Any, Tuple  # Import Optional, Any, and Tuple
+from typing import Optional, Any, Dict, Sequence, Tuple  # Import Optional, Any, and Tuple
 # LangChain imports for Text-to-SQL
 from langchain_openai import ChatOpenAI
 from langchain_community.utilities.sql_database import SQLDatabase
 from langchain.chains import create_sql_query_chain
 from langchain.prompts import PromptTemplate
 from app.core.config import settings
+from app.core.profiling import stage
+from app.db.session import AsyncSessionLocal
+from app.services.coalescing_service import data_version_flight, sql_flight
+from app.services import schema_catalog_service
+from app.services.schema_catalog_service import SchemaCatalog, initialize_schema_catalog
+from app.services.sql_prompt_service import (
+    count_tokens, embed_question, example_library, initialize_example_library, record_prompt_tokens, select_examples
+)
 from decimal import Decimal
 import datetime # Import datetime
 
@@ -16,19 +29,17 @@ import datetime # Import datetime
 MAX_ROWS_FOR_LLM_PROMPT = 50  # Example: Limit to 50 rows
 MAX_CHARS_FOR_LLM_PROMPT = 8000 # Example: Limit to 8000 characters (approx 2k tokens)
 
-# Assuming engine is available for sync usage if needed, but we primarily use async session
 # For LangChain\'s SQLDatabase utility, a synchronous SQLAlchemy engine is typically used.
 sync_db_url = settings.DATABASE_URL.replace("postgresql+asyncpg", "postgresql")
-# Initialize SQLDatabase for LangChain, focused on data_orders table
-# Providing sample rows helps the LLM understand the data structure.
-db_langchain = SQLDatabase.from_uri(
-    sync_db_url,
-    include_tables=['data_orders'],
-    sample_rows_in_table_info=3  # Number of sample rows to include in table info
-)
 
-# Initialize LLM
-llm = ChatOpenAI(model="gpt-3.5-turbo", temperature=0, openai_api_key=settings.OPENAI_API_KEY)
+# Heavy Text-to-SQL state (database connection, LLM client, chain).
+# Nothing connects at import time: initialize_text_to_sql() builds these once per worker
+# process, after the server has forked, from the application lifespan.
+sync_engine: Optional[Engine] = None
+db_langchain: Optional[SQLDatabase] = None
+llm: Optional[ChatOpenAI] = None
+generate_query_chain = None
+fixed_prompt_tokens = 0
 
 # Prompt template for generating SQL queries.
 # The LLM is shown the full thinking process (Query, Result, Answer)
@@ -36,83 +47,90 @@ llm = ChatOpenAI(model="gpt-3.5-turbo", temperature=0, openai_api_key=settings.O
 # Column names are quoted if they contain spaces or special characters.
 # Adjusted example to use "order_type" and LOWER() for case-insensitivity.
 SQL_QUERY_PROMPT_TEMPLATE = """Given an input question, create a syntactically correct query for a PostgreSQL database to run.
-Only use the following table (schema details might be limited by {top_k} if applicable):
+Only use the following tables (schema details might be limited by {top_k} if applicable):
 {table_info}
 
-Important notes about terminology:
-1. The words "order" and "shipment" are used interchangeably by users. They refer to the same concepts.
-2. If someone asks about "orders" or "shipments", they're referring to the "data_orders" table.
-3. Users may refer to specific types of orders using business terms such as "sales order", "purchase order", "return", "warehouse transfer", or "material transfer". These terms correspond to values in the column "order_class" (not "order_type"). If a user asks about any of these types (e.g., "sales orders"), generate a SQL query that filters using WHERE "order_class" ILIKE '%Sales Order%' (or the appropriate pattern for the term used). Do not use the "order_type" column for these cases. In your natural language answer, explicitly mention which order_class values are included by the filter, and let the user know they can request to exclude any specific type if needed.
-4. When a user asks to "list", "show", or "what are the" distinct values of a textual or categorical column (e.g., customer names, product categories, warehouse locations), use `SELECT DISTINCT column_name FROM table_name`. If the question implies counting or aggregation (e.g., "how many orders per customer"), then `GROUP BY` is appropriate instead of `DISTINCT` on the primary selected column. Always consider adding an `ORDER BY` clause for consistent results when using `DISTINCT`.
-
-Column definitions:
-- "order_type": Specifies if it's 'Inbound' or 'Outbound'. Users might refer to this as "shipment type" as well.
-- "order_class": Specifies the classification (e.g., 'warehouse transfer', 'purchase order', 'sales order', 'return'). Users might call this "shipment class" too.
-- "date", "year", "month", "month_name", "quarter", "week", "day": These columns represent the specific date and its components. "month" is the month number (1-12) and "month_name" is the textual representation (e.g., 'January', 'February'). Use these for time-based grouping or filtering. For example, to filter for a specific year, use WHERE "year" = 2024. When displaying monthly data using "month_name", ensure results are sorted chronologically by the numeric "month". To do this, include both "month_name" and "month" in the GROUP BY clause, and then ORDER BY "month". You should select "month_name" for display. If the question implies only showing the month name, you do not need to select the "month" column itself, but it must be in the GROUP BY clause for correct ordering. For example: `SELECT "month_name", COUNT(*) ... GROUP BY "month_name", "month" ORDER BY "month"`. If detailed month and year context is needed in the output, you can select "month" as well: `SELECT "month_name", "month", ... GROUP BY "month_name", "month" ORDER BY "month"`. To group by a specific date, use GROUP BY "date".
-
+Important notes:
+- When a user asks to "list", "show", or "what are the" distinct values of a textual or categorical column (e.g., customer names, product categories, warehouse locations), use `SELECT DISTINCT column_name FROM table_name`. If the question implies counting or aggregation (e.g., "how many orders per customer"), then `GROUP BY` is appropriate instead of `DISTINCT` on the primary selected column. Always consider adding an `ORDER BY` clause for consistent results when using `DISTINCT`.
+{table_notes}
 Pay close attention to the column names and types. Quote column names if they contain spaces or are keywords.
 Use LOWER() for case-insensitive string comparisons.
 
 # EXAMPLES
-# Example 1: Total count using "orders" terminology
-Question: How many inbound and outbound orders are there?
-SQLQuery: SELECT "order_type", COUNT(*) as count FROM data_orders GROUP BY "order_type" ORDER BY "order_type"
-
-# Example 2: Same query but using "shipments" terminology
-Question: Can you break down all shipments by shipment type?
-SQLQuery: SELECT "order_type", COUNT(*) as count FROM data_orders GROUP BY "order_type" ORDER BY "order_type"
-
-# Example 3: Distribution by class showing both terminologies
-Question: What are the different shipment classes for outbound orders?
-SQLQuery: SELECT "order_class", COUNT(*) as count FROM data_orders WHERE LOWER("order_type") = 'outbound' GROUP BY "order_class" ORDER BY count DESC
-
-# Example 4: Grouping by month and filtering by year (display month name, sort chronologically)
-Question: How many inbounds and outbounds per month in 2024?
-SQLQuery: SELECT "order_type", "month_name", COUNT(*) as count FROM data_orders WHERE "year" = 2024 GROUP BY "order_type", "month_name", "month" ORDER BY "order_type", "month"
-
-# Example 5: Grouping by week and filtering by year (no breakdown by order_type)
-Question: How many orders per week for 2025?
-SQLQuery: SELECT "week", COUNT(*) as count FROM data_orders WHERE "year" = 2025 GROUP BY "week" ORDER BY "week"
-
-# Example 6: Inbounds for January 2024 and 2025 (display month name, sort chronologically)
-Question: How many inbounds for January 2024 and 2025?
-SQLQuery: SELECT "year", "month_name", COUNT(*) as inbound_count FROM data_orders WHERE LOWER("order_type") = 'inbound' AND "month" = 1 AND ("year" = 2024 OR "year" = 2025) GROUP BY "year", "month_name", "month" ORDER BY "year", "month"
-
-# Example 7: All sales orders (always include order_class in the SELECT clause when filtering by order_class)
-Question: How many sales orders?
-SQLQuery: SELECT "order_class", COUNT(*) as sales_order_count FROM data_orders WHERE "order_class" ILIKE '%Sales Order%' GROUP BY "order_class"
-
-# Example 8: All sales orders per month (display month name, sort chronologically)
-Question: How many sales orders per month?
-SQLQuery: SELECT "order_class", "month_name", COUNT(*) as sales_order_count FROM data_orders WHERE "order_class" ILIKE '%Sales Order%' GROUP BY "order_class", "month_name", "month" ORDER BY "order_class", "month"
-
-# Example 9: All sales orders per date (always include order_class in the SELECT clause when filtering by order_class)
-Question: How many sales orders per date?
-SQLQuery: SELECT "order_class", "date", COUNT(*) as sales_order_count FROM data_orders WHERE "order_class" ILIKE '%Sales Order%' GROUP BY "order_class", "date" ORDER BY "date"
-
-# Example 10: Listing unique customer names with a filter
-Question: What customers' names start with the letter A?
-SQLQuery: SELECT DISTINCT "customer" FROM data_orders WHERE "customer" ILIKE 'a%' ORDER BY "customer"
-
-# Example 11: Counting specific order_class for customers matching a name pattern
-Question: How many sales orders for customers whose names start with B?
-SQLQuery: SELECT "customer", "order_class", COUNT(*) as count FROM data_orders WHERE "customer" ILIKE 'b%' AND "order_class" ILIKE '%Sales Order%' GROUP BY "customer", "order_class" ORDER BY "customer", "order_class"
-
-# Example 12: Count orders per month (display month name, sort chronologically by month number)
-Question: How many orders per month?
-SQLQuery: SELECT "month_name", COUNT(*) as order_count FROM data_orders GROUP BY "month_name", "month" ORDER BY "month"
+{examples}
 
 Question: {input}
 SQLQuery:
 """
 
+# Notes about specific tables, only added to the prompt when the table is among the ones
+# selected for the question (so a question about another table is not steered towards it)
+TABLE_PROMPT_NOTES: Dict[str, str] = {
+    "data_orders": """
+Terminology of the "data_orders" table:
+- The words "order" and "shipment" are used interchangeably by users. They refer to the same concepts.
+- If someone asks about "orders" or "shipments", they're referring to the "data_orders" table.
+- Users may refer to specific types of orders using business terms such as "sales order", "purchase order", "return", "warehouse transfer", or "material transfer". These terms correspond to values in the column "order_class" (not "order_type"). If a user asks about any of these types (e.g., "sales orders"), generate a SQL query that filters using WHERE "order_class" ILIKE '%Sales Order%' (or the appropriate pattern for the term used). Do not use the "order_type" column for these cases. In your natural language answer, explicitly mention which order_class values are included by the filter, and let the user know they can request to exclude any specific type if needed.
+
+Column definitions of the "data_orders" table:
+- "order_type": Specifies if it's 'Inbound' or 'Outbound'. Users might refer to this as "shipment type" as well.
+- "order_class": Specifies the classification (e.g., 'warehouse transfer', 'purchase order', 'sales order', 'return'). Users might call this "shipment class" too.
+- "date", "year", "month", "month_name", "quarter", "week", "day": These columns represent the specific date and its components. "month" is the month number (1-12) and "month_name" is the textual representation (e.g., 'January', 'February'). Use these for time-based grouping or filtering. For example, to filter for a specific year, use WHERE "year" = 2024. When displaying monthly data using "month_name", ensure results are sorted chronologically by the numeric "month". To do this, include both "month_name" and "month" in the GROUP BY clause, and then ORDER BY "month". You should select "month_name" for display. If the question implies only showing the month name, you do not need to select the "month" column itself, but it must be in the GROUP BY clause for correct ordering. For example: `SELECT "month_name", COUNT(*) ... GROUP BY "month_name", "month" ORDER BY "month"`. If detailed month and year context is needed in the output, you can select "month" as well: `SELECT "month_name", "month", ... GROUP BY "month_name", "month" ORDER BY "month"`. To group by a specific date, use GROUP BY "date".
+""",
+}
+
+def render_table_notes(table_names: Sequence[str]) -> str:
+    """Returns the prompt notes of the selected tables that have any."""
+    return "".join(TABLE_PROMPT_NOTES[name] for name in sorted(table_names) if name in TABLE_PROMPT_NOTES)
+
+# "examples" is filled per request with the few-shot examples most similar to the question
+# (see sql_prompt_service), within the SQL_PROMPT_TOKEN_BUDGET; "table_notes" with render_table_notes().
 custom_sql_query_prompt = PromptTemplate(
-    input_variables=["input", "table_info", "top_k"],  # Add "top_k" here
+    input_variables=["input", "table_info", "top_k", "examples", "table_notes"],  # Add "top_k" here
     template=SQL_QUERY_PROMPT_TEMPLATE
 )
 
-# Create the chain for generating SQL queries
-generate_query_chain = create_sql_query_chain(llm, db_langchain, prompt=custom_sql_query_prompt)
+def _build_sql_database(engine: Engine, catalog: SchemaCatalog) -> SQLDatabase:
+    # Serving the catalogue's table info avoids querying sample rows on every request.
+    # Tables are reflected lazily, the first time a question needs them.
+    catalog_db = SQLDatabase(
+        engine,
+        include_tables=catalog.table_names,
+        custom_table_info=catalog.table_info,
+        lazy_table_reflection=True,
+        view_support=True  # TEXT_TO_SQL_TABLES may name views
+    )
+    catalog_db.get_table_info([catalog.default_table])  # Warm up reflection off the event loop
+    return catalog_db
+
+async def initialize_text_to_sql():
+    """
+    Initializes the Text-to-SQL resources for this worker process.
+    The schema catalogue is read from the shared cache when another worker already built it.
+    """
+    global sync_engine, db_langchain, llm, generate_query_chain, fixed_prompt_tokens
+    if generate_query_chain is not None:
+        return
+
+    # Token counting must be ready before the catalogue measures its table info
+    await initialize_example_library()
+    sync_engine = create_engine(sync_db_url)
+    catalog = await initialize_schema_catalog(sync_engine)
+    db_langchain = await asyncio.to_thread(_build_sql_database, sync_engine, catalog)
+    llm = ChatOpenAI(model=settings.SQL_MODEL, temperature=0, openai_api_key=settings.OPENAI_API_KEY)
+
+    # Size of everything in the SQL prompt except the table info and notes, the examples and the question
+    fixed_prompt_tokens = count_tokens(
+        custom_sql_query_prompt.format(input="", table_info="", top_k="5", examples="", table_notes="")
+    )
+    # Create the chain for generating SQL queries
+    generate_query_chain = create_sql_query_chain(llm, db_langchain, prompt=custom_sql_query_prompt)
+
+def shutdown_text_to_sql():
+    global sync_engine, db_langchain, llm, generate_query_chain
+    if sync_engine is not None:
+        sync_engine.dispose()
+    sync_engine = db_langchain = llm = generate_query_chain = None
 
 async def execute_sql_query(db_session: AsyncSession, query: str) -> Tuple[str, Optional[Any]]:
     """
@@ -121,21 +139,23 @@ async def execute_sql_query(db_session: AsyncSession, query: str) -> Tuple[str,
     and structured JSON data (list of dicts).
     """
     try:
-        result = await db_session.execute(text(query))
-        rows = result.mappings().all()  # Returns a list of RowMapping (dict-like)
+        with stage("sql_execution"):
+            result = await db_session.execute(text(query))
+            rows = result.mappings().all()  # Returns a list of RowMapping (dict-like)
         
         # Convert RowMapping objects to plain dicts for JSON serialization and handle Decimal types
-        json_results = []
-        for row_mapping in rows:
-            processed_row = {}
-            for key, value in dict(row_mapping).items():
-                if isinstance(value, Decimal):
-                    processed_row[key] = str(value)  # Convert Decimal to string
-                elif isinstance(value, (datetime.date, datetime.datetime)): # Handle date/datetime
-                    processed_row[key] = value.isoformat() # Convert date/datetime to ISO string
-                else:
-                    processed_row[key] = value
-            json_results.append(processed_row)
+        with stage("row_conversion"):
+            json_results = []
+            for row_mapping in rows:
+                processed_row = {}
+                for key, value in dict(row_mapping).items():
+                    if isinstance(value, Decimal):
+                        processed_row[key] = str(value)  # Convert Decimal to string
+                    elif isinstance(value, (datetime.date, datetime.datetime)): # Handle date/datetime
+                        processed_row[key] = value.isoformat() # Convert date/datetime to ISO string
+                    else:
+                        processed_row[key] = value
+                json_results.append(processed_row)
 
         if not json_results:
             return "No results found.", [] # Return empty list for json_data
@@ -165,30 +185,142 @@ async def execute_sql_query(db_session: AsyncSession, query: str) -> Tuple[str,
         raise Exception(f"Error executing SQL query: {str(e)}. Query: {query}")
 
 
-async def get_answer_from_table_via_langchain(db_session: AsyncSession, question: str, table_name: str = "data_orders") -> Tuple[str, Optional[Any]]:
+async def execute_shared_sql_query(query: str) -> Tuple[str, Optional[Any]]:
+    """
+    Executes a generated SQL query, sharing one execution between concurrent requests
+    that produced the exact same SQL.
+    The query runs on its own session because the result outlives any single caller.
+    """
+    async def run() -> Tuple[str, Optional[Any]]:
+        async with AsyncSessionLocal() as db_session:
+            return await execute_sql_query(db_session, query)
+
+    return await sql_flight.do(query, run)
+
+
+# Per-worker cache of data versions: table names -> (checked at, version)
+_data_versions: Dict[Tuple[str, ...], Tuple[float, Optional[str]]] = {}
+
+# Relations whose statistics make up the data version: the requested tables and, for views,
+# every relation they read (recursively, so views over views are covered too)
+DATA_VERSION_QUERY = """
+WITH RECURSIVE relations(relid) AS (
+    SELECT to_regclass(quote_ident(name))::oid
+    FROM unnest(CAST(:table_names AS text[])) AS name
+    WHERE to_regclass(quote_ident(name)) IS NOT NULL
+    UNION
+    SELECT dep.refobjid
+    FROM relations r
+    JOIN pg_rewrite rw ON rw.ev_class = r.relid
+    JOIN pg_depend dep ON dep.classid = 'pg_rewrite'::regclass AND dep.objid = rw.oid
+        AND dep.refclassid = 'pg_class'::regclass AND dep.refobjid <> r.relid
+)
+SELECT s.relid::regclass::text, pg_relation_filenode(s.relid), s.n_tup_ins, s.n_tup_upd, s.n_tup_del
+FROM pg_stat_all_tables s
+WHERE s.relid IN (SELECT relid FROM relations)
+"""
+
+async def get_data_version(table_names: Optional[Sequence[str]] = None) -> Optional[str]:
+    """
+    Returns a token that changes whenever rows of the tables (by default, every Text-to-SQL
+    table) are inserted, updated or deleted, or a table is rewritten (TRUNCATE, VACUUM FULL,
+    REFRESH MATERIALIZED VIEW). Views are versioned by the tables they read.
+    It is built from PostgreSQL's statistics counters, so no table data is read, and it is
+    reused for DATA_VERSION_TTL_SECONDS; when it expires, concurrent requests share a single
+    refresh instead of each querying the statistics. Returns None when the version cannot be
+    determined (a table does not exist, or the query failed); callers then neither validate
+    with ETags nor use the answer cache.
+    """
+    if table_names is None:
+        catalog = schema_catalog_service.schema_catalog
+        table_names = catalog.table_names if catalog is not None else [schema_catalog_service.DEFAULT_TABLE]
+    key = tuple(table_names)
+    checked_at, version = _data_versions.get(key, (0.0, None))
+    if time.monotonic() - checked_at < settings.DATA_VERSION_TTL_SECONDS:
+        return version
+    return await data_version_flight.do(key, lambda: _refresh_data_version(key))
+
+async def _refresh_data_version(table_names: Tuple[str, ...]) -> Optional[str]:
+    try:
+        async with AsyncSessionLocal() as db_session:
+            # Names are quoted like SQLAlchemy/LangChain quote them, so mixed-case tables resolve
+            missing = await db_session.scalar(
+                text(
+                    "SELECT count(*) FROM unnest(CAST(:table_names AS text[])) AS name "
+                    "WHERE to_regclass(quote_ident(name)) IS NULL"
+                ),
+                {"table_names": list(table_names)}
+            )
+            result = await db_session.execute(text(DATA_VERSION_QUERY), {"table_names": list(table_names)})
+            rows = sorted(tuple(str(value) for value in row) for row in result.all())
+        if missing:
+            print(f"Could not resolve {missing} of the tables {', '.join(table_names)} for the data version")
+            version = None
+        else:
+            version = hashlib.sha256(repr(rows).encode()).hexdigest()[:16]
+    except Exception as e:
+        print(f"Could not read the data version of {', '.join(table_names)}: {e}")
+        version = None
+    _data_versions[table_names] = (time.monotonic(), version)
+    return version
+
+
+async def get_answer_from_table_via_langchain(question: str) -> Tuple[str, Optional[Any], Optional[str]]:
     """
     Generates an SQL query from a natural language question using LangChain,
+    over the tables of the schema catalogue most relevant to the question,
     executes it, and then uses an LLM to formulate a natural language answer
     based on the query results.
-    Returns the natural language answer and structured JSON data.
+    Returns the natural language answer, structured JSON data and the SQL query that
+    produced the data (None when no query was executed successfully).
+    Concurrent requests that generate identical SQL share a single database execution.
     """
     try:
+        if generate_query_chain is None:
+            # Normally done by the application lifespan; covers scripts and other entry points
+            await initialize_text_to_sql()
+
         # Step 1: Generate SQL query
+        catalog = schema_catalog_service.schema_catalog
+        # Table and example selectors that rank by embeddings share one embedding of the question
+        embedder = catalog.embedder or example_library.embedder
+        question_embedding = None
+        if embedder is not None:
+            with stage("question_embedding"):
+                question_embedding = await embed_question(embedder, question)
+        # Only the tables relevant to the question are described, so the prompt does not grow with the catalogue
+        with stage("table_selection"):
+            table_names, table_info_tokens = await catalog.select_tables(question, question_embedding=question_embedding)
+        table_notes = render_table_notes(table_names)
+        # Only the examples most similar to the question (and written for the selected tables)
+        # are sent, within the token budget
+        with stage("example_selection"):
+            examples, prompt_tokens, _ = await select_examples(
+                question, fixed_prompt_tokens + table_info_tokens + count_tokens(table_notes + question),
+                table_names=table_names, question_embedding=question_embedding
+            )
+        record_prompt_tokens(prompt_tokens)
+        print(f"SQL prompt tokens: {prompt_tokens} (tables: {', '.join(table_names)})")
+
         # The chain.ainvoke returns a string (the SQL query)
-        # The create_sql_query_chain will pass input, table_info, and top_k (with its default)
-        generated_sql_query = await generate_query_chain.ainvoke({"question": question})
+        # The create_sql_query_chain will pass input, table_info (for table_names_to_use), and top_k (with its default);
+        # extra keys such as "examples" are passed through to the prompt
+        with stage("sql_generation"):
+            generated_sql_query = await generate_query_chain.ainvoke(
+                {"question": question, "table_names_to_use": table_names, "examples": examples, "table_notes": table_notes}
+            )
         
         if not generated_sql_query or not isinstance(generated_sql_query, str):
             raise ValueError("Failed to generate SQL query or query is not a string.")
 
         sql_query = generated_sql_query.strip()
         if not sql_query: # Handle empty query string
-             return "I could not understand how to query the database for your question. Please try rephrasing.", None
+             return "I could not understand how to query the database for your question. Please try rephrasing.", None, None
 
 
         # Step 2: Execute SQL query
         try:
-            raw_results_str, json_data = await execute_sql_query(db_session, sql_query)
+            raw_results_str, json_data = await execute_shared_sql_query(sql_query)
         except Exception as query_exec_e:
             # Error during query execution (e.g., bad SQL, DB down)
             error_message = str(query_exec_e)
@@ -204,12 +336,12 @@ async def get_answer_from_table_via_langchain(db_session: AsyncSession, question
             Response:
             """
             error_response = await llm.ainvoke(error_interpretation_prompt)
-            return error_response.content, None
+            return error_response.content, None, None
 
         # Step 3: Generate natural language answer from results using LLM
         answer_generation_prompt_text = f"""
         Based on the user's question and the following SQL query and its result, provide a concise natural language answer.
-        If the query result is empty or does not seem to directly answer the question, state that the requested information could not be found in the '{table_name}' table or that we are still in development for other data sources.
+        If the query result is empty or does not seem to directly answer the question, state that the requested information could not be found in the {', '.join(table_names)} table(s) or that we are still in development for other data sources.
         If the SQLResult indicates that it was truncated, mention that the provided data is a subset of the full results due to its size.
 
         User Question: "{question}"
@@ -218,15 +350,16 @@ async def get_answer_from_table_via_langchain(db_session: AsyncSession, question
 
         Natural Language Answer:
         """
-        final_answer_response = await llm.ainvoke(answer_generation_prompt_text)
+        with stage("answer_generation"):
+            final_answer_response = await llm.ainvoke(answer_generation_prompt_text)
         nl_answer = final_answer_response.content.strip()
 
-        return nl_answer, json_data
+        return nl_answer, json_data, sql_query
 
     except ValueError as ve: # Catch specific errors like failed query generation
         print(f"ValueError in Langchain process: {ve}")
-        return f"I encountered an issue processing your request: {str(ve)}", None
+        return f"I encountered an issue processing your request: {str(ve)}", None, None
     except Exception as e:
         # Catch-all for other unexpected errors in the Langchain process
         print(f"Unexpected error in get_answer_from_table_via_langchain: {e}")
-        return "I am sorry, but I encountered an unexpected issue while trying to process your request. We are looking into it.", None
+        return "I am sorry, but I encountered an unexpected issue while trying to process your request. We are looking into it.", None, None
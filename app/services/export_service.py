@@ -0,0 +1,140 @@
+import csv
+import hashlib
+import io
+import re
+from decimal import Decimal
+from typing import AsyncIterator, List, Optional
+
+import pyarrow as pa
+import zstandard
+from sqlalchemy import text
+
+from app.core.cache import get_shared_cache
+from app.core.config import settings
+from app.db.session import engine
+
+EXPORT_FORMATS = {
+    "csv": ("text/csv", "csv"),
+    "arrow": ("application/vnd.apache.arrow.stream", "arrow"),
+}
+# End-of-stream marker of the Arrow IPC streaming format
+_ARROW_EOS = b"\xff\xff\xff\xff\x00\x00\x00\x00"
+
+def validate_read_only_query(sql: str) -> Optional[str]:
+    """
+    Returns the query normalized for export if it is a single SELECT (or WITH ... SELECT)
+    statement, otherwise None. Exports also run inside a READ ONLY transaction.
+    """
+    query = sql.strip().rstrip(";").strip()
+    if ";" in query:
+        return None
+    if not re.match(r"^(select|with)\b", query, re.IGNORECASE):
+        return None
+    return query
+
+def _export_key(export_id: str) -> str:
+    return f"export:{export_id}"
+
+async def register_export(sql: str) -> Optional[str]:
+    """
+    Stores a validated generated query so its full result can be exported later, and returns
+    the export ID given to the client. Clients never send SQL themselves, only this ID.
+    """
+    query = validate_read_only_query(sql)
+    if query is None:
+        return None
+    export_id = hashlib.sha256(query.encode()).hexdigest()[:32]
+    await get_shared_cache().set(_export_key(export_id), query, ttl_seconds=settings.EXPORT_TTL_SECONDS)
+    return export_id
+
+async def get_export_query(export_id: str) -> Optional[str]:
+    return await get_shared_cache().get(_export_key(export_id))
+
+# Arrow types of the PostgreSQL column types (by type name); other types are exported as strings
+_ARROW_TYPES = {
+    "bool": pa.bool_(),
+    "int2": pa.int16(),
+    "int4": pa.int32(),
+    "int8": pa.int64(),
+    "float4": pa.float32(),
+    "float8": pa.float64(),
+    "numeric": pa.float64(),  # Decimals become floats so the series can be charted directly
+    "date": pa.date32(),
+    "timestamp": pa.timestamp("us"),
+    "timestamptz": pa.timestamp("us", tz="UTC"),
+}
+
+async def _stream_result(query: str) -> AsyncIterator:
+    """
+    Yields the result's columns as (name, PostgreSQL type name) pairs, then its rows in batches.
+    The columns come from the prepared statement, so they are known before (and without) any row.
+    """
+    # Server-side cursor: only one batch of rows is held in memory at a time
+    async with engine.connect() as conn:
+        await conn.execute(text("SET TRANSACTION READ ONLY"))
+        raw_connection = await conn.get_raw_connection()
+        statement = await raw_connection.driver_connection.prepare(query)
+        yield [(attribute.name, attribute.type.name) for attribute in statement.get_attributes()]
+        result = await conn.stream(text(query))
+        async for partition in result.partitions(settings.EXPORT_BATCH_SIZE):
+            yield partition
+
+async def _csv_chunks(query: str) -> AsyncIterator[bytes]:
+    batches = _stream_result(query)
+    try:
+        columns = await batches.__anext__()
+        buffer = io.StringIO()
+        csv.writer(buffer).writerow([name for name, _type in columns])
+        # The header is sent even when the result is empty
+        yield buffer.getvalue().encode("utf-8")
+        async for rows in batches:
+            buffer = io.StringIO()
+            csv.writer(buffer).writerows(rows)
+            yield buffer.getvalue().encode("utf-8")
+    finally:
+        # Releases the connection right away if the client disconnects mid-stream
+        await batches.aclose()
+
+def _arrow_schema(columns: List[tuple[str, str]]) -> pa.Schema:
+    return pa.schema([pa.field(name, _ARROW_TYPES.get(type_name, pa.string())) for name, type_name in columns])
+
+def _arrow_converter(arrow_type: pa.DataType):
+    if pa.types.is_string(arrow_type):
+        return lambda value: value if value is None or isinstance(value, str) else str(value)
+    if pa.types.is_floating(arrow_type):
+        return lambda value: float(value) if isinstance(value, Decimal) else value
+    return lambda value: value
+
+async def _arrow_chunks(query: str) -> AsyncIterator[bytes]:
+    batches = _stream_result(query)
+    try:
+        columns = await batches.__anext__()
+        # The schema comes from the column types, not from the first rows, so every batch (and an
+        # empty result) has the same column names and types
+        schema = _arrow_schema(columns)
+        converters = [_arrow_converter(field.type) for field in schema]
+        yield schema.serialize().to_pybytes()
+        async for rows in batches:
+            records = [
+                {field.name: convert(value) for field, convert, value in zip(schema, converters, row)}
+                for row in rows
+            ]
+            yield pa.RecordBatch.from_pylist(records, schema=schema).serialize().to_pybytes()
+        yield _ARROW_EOS
+    finally:
+        await batches.aclose()
+
+async def _zstd_compress(chunks: AsyncIterator[bytes]) -> AsyncIterator[bytes]:
+    compressor = zstandard.ZstdCompressor(level=3).compressobj()
+    async for chunk in chunks:
+        compressed = compressor.compress(chunk)
+        if compressed:
+            yield compressed
+    yield compressor.flush()
+
+def stream_export(query: str, export_format: str, compression: Optional[str] = None) -> AsyncIterator[bytes]:
+    """Streams the full result of the query as CSV or Arrow IPC, optionally zstd-compressed."""
+    chunks = _csv_chunks(query) if export_format == "csv" else _arrow_chunks(query)
+    if compression == "zstd":
+        chunks = _zstd_compress(chunks)
+    return chunks
@@ -0,0 +1,188 @@
+import asyncio
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, Optional
+
+from app.core.cache import get_shared_cache
+from app.core.config import settings
+from app.services.vector_store_service import (
+    IngestionCancelled,
+    check_ingestible_table,
+    count_table_rows,
+    get_vector_store,
+    ingest_table_rows,
+    rebuild_vector_store,
+)
+
+# Job kinds:
+# - "ingest": appends the table's rows to the live collection.
+# - "reindex": rebuilds the collection blue/green (shadow collection + atomic swap).
+JOB_KINDS = ("ingest", "reindex")
+JOB_STATE_TTL_SECONDS = 24 * 3600
+MAX_FINISHED_JOBS_KEPT = 100
+MONITOR_INTERVAL_SECONDS = 1.0
+
+# Ingestion work runs on its own thread pool so it never takes threads from request handling.
+# The semaphore keeps extra jobs queued until a slot is free.
+_ingestion_executor = ThreadPoolExecutor(max_workers=settings.INGEST_MAX_CONCURRENT_JOBS, thread_name_prefix="ingestion")
+_job_slots = asyncio.Semaphore(settings.INGEST_MAX_CONCURRENT_JOBS)
+
+class IngestionJob:
+    """State of a queued/running ingestion job. Progress fields are updated from the worker thread."""
+
+    def __init__(self, kind: str, table_name: str, project: Optional[str] = None):
+        self.id = uuid.uuid4().hex
+        self.kind = kind
+        self.table_name = table_name
+        self.project = project
+        self.status = "queued"
+        self.total_rows: Optional[int] = None
+        self.processed_rows = 0
+        self.error: Optional[str] = None
+        self.created_at = time.time()
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self.cancel_event = threading.Event()
+        self.task: Optional[asyncio.Task] = None
+
+    @property
+    def finished(self) -> bool:
+        return self.status in ("completed", "failed", "cancelled")
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "id": self.id,
+            "kind": self.kind,
+            "table_name": self.table_name,
+            "project": self.project,
+            "status": self.status,
+            "total_rows": self.total_rows,
+            "processed_rows": self.processed_rows,
+            "progress": round(self.processed_rows / self.total_rows, 4) if self.total_rows else None,
+            "error": self.error,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+        }
+
+# Jobs started by this worker process. Their state is also published to the shared cache,
+# so any worker can report progress or forward a cancellation.
+_jobs: Dict[str, IngestionJob] = {}
+
+def _job_key(job_id: str) -> str:
+    return f"ingest_job:{job_id}"
+
+def _cancel_key(job_id: str) -> str:
+    return f"ingest_job_cancel:{job_id}"
+
+async def _publish(job: IngestionJob):
+    await get_shared_cache().set(_job_key(job.id), job.to_dict(), ttl_seconds=JOB_STATE_TTL_SECONDS)
+
+def _execute_job(job: IngestionJob):
+    """Runs in the ingestion thread pool."""
+    job.total_rows = count_table_rows(job.table_name)
+
+    def on_progress(processed: int):
+        job.processed_rows = processed
+
+    if job.kind == "reindex":
+        rebuild_vector_store(
+            job.table_name, job.project, settings.INGEST_BATCH_SIZE,
+            on_progress=on_progress, should_cancel=job.cancel_event.is_set
+        )
+    else:
+        ingest_table_rows(
+            get_vector_store(), job.table_name, job.project, settings.INGEST_BATCH_SIZE,
+            on_progress=on_progress, should_cancel=job.cancel_event.is_set
+        )
+
+async def _monitor_job(job: IngestionJob):
+    # Publishes progress periodically and picks up cancellations requested through other workers
+    cache = get_shared_cache()
+    while True:
+        await asyncio.sleep(MONITOR_INTERVAL_SECONDS)
+        if await cache.get(_cancel_key(job.id)):
+            job.cancel_event.set()
+        await _publish(job)
+
+async def _run_job(job: IngestionJob):
+    try:
+        async with _job_slots:
+            if job.cancel_event.is_set():
+                raise IngestionCancelled()
+            job.status = "running"
+            job.started_at = time.time()
+            await _publish(job)
+            monitor = asyncio.create_task(_monitor_job(job))
+            try:
+                loop = asyncio.get_running_loop()
+                await loop.run_in_executor(_ingestion_executor, _execute_job, job)
+            finally:
+                monitor.cancel()
+        job.status = "completed"
+        print(f"Ingestion job {job.id} ({job.kind} {job.table_name}) completed: {job.processed_rows} rows.")
+    except (IngestionCancelled, asyncio.CancelledError):
+        # If the thread is still running it stops at the next batch and drops its shadow collection
+        job.cancel_event.set()
+        job.status = "cancelled"
+    except Exception as e:
+        print(f"Ingestion job {job.id} failed: {e}")
+        job.status = "failed"
+        job.error = str(e)
+    finally:
+        job.finished_at = time.time()
+        await _publish(job)
+        _prune_finished_jobs()
+
+def _prune_finished_jobs():
+    finished = [job for job in _jobs.values() if job.finished]
+    for job in sorted(finished, key=lambda j: j.created_at)[:-MAX_FINISHED_JOBS_KEPT]:
+        del _jobs[job.id]
+
+async def submit_job(kind: str, table_name: str, project: Optional[str] = None) -> Dict[str, Any]:
+    """Queues an ingestion job and returns its initial state."""
+    if kind not in JOB_KINDS:
+        raise ValueError(f"Unknown job kind '{kind}'. Available: {list(JOB_KINDS)}")
+    await asyncio.to_thread(check_ingestible_table, table_name)
+
+    job = IngestionJob(kind, table_name, project)
+    _jobs[job.id] = job
+    await _publish(job)
+    job.task = asyncio.create_task(_run_job(job))
+    return job.to_dict()
+
+async def get_job_status(job_id: str) -> Optional[Dict[str, Any]]:
+    job = _jobs.get(job_id)
+    if job is not None:
+        return job.to_dict()
+    return await get_shared_cache().get(_job_key(job_id))
+
+async def cancel_job(job_id: str) -> Optional[Dict[str, Any]]:
+    """
+    Requests cancellation of a job. Queued jobs are cancelled right away; running jobs
+    stop at the next batch boundary. Jobs owned by another worker are flagged through the shared cache.
+    """
+    job = _jobs.get(job_id)
+    if job is None:
+        state = await get_shared_cache().get(_job_key(job_id))
+        if state is not None and state["status"] in ("queued", "running"):
+            await get_shared_cache().set(_cancel_key(job_id), True, ttl_seconds=JOB_STATE_TTL_SECONDS)
+        return state
+
+    if not job.finished:
+        job.cancel_event.set()
+        if job.status == "queued" and job.task is not None:
+            job.task.cancel()
+    return job.to_dict()
+
+async def shutdown_ingestion_jobs():
+    """Cancels this worker's unfinished jobs; called from the application lifespan."""
+    tasks = [job.task for job in _jobs.values() if job.task is not None and not job.task.done()]
+    for job in _jobs.values():
+        job.cancel_event.set()
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+    _ingestion_executor.shutdown(wait=False, cancel_futures=True)
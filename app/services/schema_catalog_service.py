@@ -0,0 +1,170 @@
+import asyncio
+import fnmatch
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from langchain_community.utilities.sql_database import SQLDatabase
+from sqlalchemy import inspect
+from sqlalchemy.engine import Engine
+
+from app.core.cache import get_shared_cache
+from app.core.config import settings
+from app.services.sql_prompt_service import TfidfIndex, cached_embeddings, count_tokens, embed_question
+
+# Used when a question matches no table at all (the original, and best documented, table)
+DEFAULT_TABLE = "data_orders"
+# Tables that are never exposed to Text-to-SQL with TEXT_TO_SQL_TABLES="*", on top of
+# TEXT_TO_SQL_EXCLUDE_TABLES: the vector store's own tables
+ALWAYS_EXCLUDED_TABLES = ("langchain_pg_*",)
+# After the best match, a table is only included if it scores at least this fraction of the best score
+RELATIVE_SCORE_CUTOFF = 0.5
+
+def _split_setting(value: str) -> List[str]:
+    return [item.strip() for item in value.split(",") if item.strip()]
+
+def is_excluded_table(table_name: str) -> bool:
+    patterns = ALWAYS_EXCLUDED_TABLES + tuple(_split_setting(settings.TEXT_TO_SQL_EXCLUDE_TABLES))
+    return any(fnmatch.fnmatchcase(table_name, pattern) for pattern in patterns)
+
+def resolve_table_names(engine: Engine) -> List[str]:
+    """
+    Returns the tables available to Text-to-SQL (and vector store ingestion): the names in
+    TEXT_TO_SQL_TABLES, or, when it is "*", every table and view in the default schema that
+    does not match TEXT_TO_SQL_EXCLUDE_TABLES.
+    """
+    configured = _split_setting(settings.TEXT_TO_SQL_TABLES)
+    if configured != ["*"]:
+        return configured
+    inspector = inspect(engine)
+    names = inspector.get_table_names() + inspector.get_view_names()
+    return sorted(name for name in names if not is_excluded_table(name))
+
+def describe_table(inspector, table_name: str) -> str:
+    """Compact, one-line description of a table (name, comment, columns) used to match questions to tables."""
+    columns = []
+    for column in inspector.get_columns(table_name):
+        details = str(column["type"])
+        if column.get("comment"):
+            details += f", {column['comment']}"
+        columns.append(f"{column['name']} ({details})")
+    try:
+        comment = inspector.get_table_comment(table_name).get("text")
+    except NotImplementedError:
+        comment = None
+    header = f"{table_name}: {comment}" if comment else table_name
+    return f"{header}. Columns: {', '.join(columns)}"
+
+def build_table_entries(engine: Engine, table_names: Sequence[str]) -> Dict[str, Dict[str, str]]:
+    """
+    Builds the catalogue entry of each table: its compact description and the table info shown
+    to the LLM (DDL plus sample rows). This reflects the tables and queries sample rows, so it
+    is done once and shared through the cache.
+    """
+    inspector = inspect(engine)
+    full_db = SQLDatabase(
+        engine,
+        include_tables=list(table_names),
+        sample_rows_in_table_info=settings.SCHEMA_SAMPLE_ROWS,
+        lazy_table_reflection=True,
+        view_support=True  # TEXT_TO_SQL_TABLES may name views
+    )
+    return {
+        name: {"description": describe_table(inspector, name), "info": full_db.get_table_info([name])}
+        for name in table_names
+    }
+
+class SchemaCatalog:
+    """
+    Indexed table descriptions. For each question, only the most relevant tables' info is put
+    in the SQL prompt, so its size does not grow with the number of tables.
+    Tables are ranked by TF-IDF similarity of their descriptions (no network call), or by
+    embedding similarity when SCHEMA_CATALOG_SELECTOR is "embedding".
+    """
+
+    def __init__(self, entries: Dict[str, Dict[str, str]]):
+        self.table_names = list(entries)
+        self.descriptions = [entries[name]["description"] for name in self.table_names]
+        self.table_info = {name: entries[name]["info"] for name in self.table_names}
+        self.token_counts = {name: count_tokens(info + "\n\n") for name, info in self.table_info.items()}
+        self.default_table = DEFAULT_TABLE if DEFAULT_TABLE in entries else self.table_names[0]
+        self._index = TfidfIndex(self.descriptions)
+        self._embeddings: Optional[List[List[float]]] = None
+        self._embedder = None
+
+    async def load_embeddings(self):
+        from langchain_openai import OpenAIEmbeddings
+
+        self._embedder = OpenAIEmbeddings(openai_api_key=settings.OPENAI_API_KEY)
+        self._embeddings = await cached_embeddings(self._embedder, self.descriptions, "schema_catalog_embeddings")
+
+    @property
+    def embedder(self):
+        """The embeddings client when tables are ranked by embeddings, otherwise None."""
+        return self._embedder if self._embeddings is not None else None
+
+    async def rank(self, question: str, question_embedding: Optional[List[float]] = None) -> List[Tuple[str, float]]:
+        """Returns (table name, similarity) pairs, most similar first."""
+        if self._embeddings is not None:
+            query = question_embedding if question_embedding is not None else await embed_question(self._embedder, question)
+            scores = [sum(a * b for a, b in zip(query, emb)) for emb in self._embeddings]
+        else:
+            scores = self._index.scores(question)
+        return sorted(zip(self.table_names, scores), key=lambda pair: pair[1], reverse=True)
+
+    async def select_tables(
+        self, question: str, max_tables: Optional[int] = None, question_embedding: Optional[List[float]] = None
+    ) -> Tuple[List[str], int]:
+        """
+        Picks up to `max_tables` tables relevant to the question; the default table when none matches.
+        Returns the table names and the token count of their table info.
+        """
+        max_tables = settings.SCHEMA_PROMPT_MAX_TABLES if max_tables is None else max_tables
+        ranked = await self.rank(question, question_embedding)
+        best_score = ranked[0][1]
+        if best_score <= 0:
+            chosen = [self.default_table]
+        else:
+            chosen = [name for name, score in ranked[:max_tables] if score >= best_score * RELATIVE_SCORE_CUTOFF]
+        return chosen, sum(self.token_counts[name] for name in chosen)
+
+    def render_table_info(self, table_names: Sequence[str]) -> str:
+        # Same layout as SQLDatabase.get_table_info (sorted, blank line between tables)
+        return "\n\n".join(sorted(self.table_info[name] for name in table_names))
+
+# One catalogue per worker process, built by initialize_schema_catalog()
+schema_catalog: Optional[SchemaCatalog] = None
+
+def _table_key(table_name: str) -> str:
+    return f"schema_table:{table_name}"
+
+async def initialize_schema_catalog(engine: Engine) -> SchemaCatalog:
+    """
+    Builds this worker's schema catalogue. Entries already built by another worker are read
+    from the shared cache; only the missing tables are reflected and sampled.
+    """
+    global schema_catalog
+    table_names = await asyncio.to_thread(resolve_table_names, engine)
+    if not table_names:
+        raise ValueError("TEXT_TO_SQL_TABLES does not name any table.")
+
+    cache = get_shared_cache()
+    entries: Dict[str, Dict[str, str]] = {}
+    for name in table_names:
+        entry = await cache.get(_table_key(name))
+        if entry is not None:
+            entries[name] = entry
+    missing = [name for name in table_names if name not in entries]
+    if missing:
+        built = await asyncio.to_thread(build_table_entries, engine, missing)
+        for name, entry in built.items():
+            await cache.set(_table_key(name), entry, ttl_seconds=settings.SCHEMA_SNAPSHOT_TTL_SECONDS)
+        entries.update(built)
+
+    catalog = SchemaCatalog({name: entries[name] for name in table_names})
+    if settings.SCHEMA_CATALOG_SELECTOR == "embedding":
+        try:
+            await catalog.load_embeddings()
+        except Exception as e:
+            print(f"Could not embed table descriptions, falling back to lexical selection: {e}")
+    schema_catalog = catalog
+    print(f"Schema catalogue ready: {len(table_names)} tables ({len(missing)} built, {len(table_names) - len(missing)} from cache)")
+    return catalog
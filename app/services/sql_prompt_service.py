@@ -0,0 +1,320 @@
+import asyncio
+import hashlib
+import math
+import re
+from collections import Counter, OrderedDict
+from typing import Any, Dict, FrozenSet, List, Optional, Sequence, Tuple
+
+from app.core.cache import get_shared_cache
+from app.core.config import settings
+
+# Worked examples for SQL generation. Only the most relevant ones for each question are
+# included in the prompt (see select_examples), so adding examples here does not grow every prompt.
+# An example is only used when the tables its SQL reads (or its optional "tables" list) were
+# selected for the question.
+SQL_EXAMPLES: List[Dict[str, str]] = [
+    {
+        "title": 'Total count using "orders" terminology',
+        "question": "How many inbound and outbound orders are there?",
+        "sql": 'SELECT "order_type", COUNT(*) as count FROM data_orders GROUP BY "order_type" ORDER BY "order_type"',
+    },
+    {
+        "title": 'Same query but using "shipments" terminology',
+        "question": "Can you break down all shipments by shipment type?",
+        "sql": 'SELECT "order_type", COUNT(*) as count FROM data_orders GROUP BY "order_type" ORDER BY "order_type"',
+    },
+    {
+        "title": "Distribution by class showing both terminologies",
+        "question": "What are the different shipment classes for outbound orders?",
+        "sql": 'SELECT "order_class", COUNT(*) as count FROM data_orders WHERE LOWER("order_type") = \'outbound\' GROUP BY "order_class" ORDER BY count DESC',
+    },
+    {
+        "title": "Grouping by month and filtering by year (display month name, sort chronologically)",
+        "question": "How many inbounds and outbounds per month in 2024?",
+        "sql": 'SELECT "order_type", "month_name", COUNT(*) as count FROM data_orders WHERE "year" = 2024 GROUP BY "order_type", "month_name", "month" ORDER BY "order_type", "month"',
+    },
+    {
+        "title": "Grouping by week and filtering by year (no breakdown by order_type)",
+        "question": "How many orders per week for 2025?",
+        "sql": 'SELECT "week", COUNT(*) as count FROM data_orders WHERE "year" = 2025 GROUP BY "week" ORDER BY "week"',
+    },
+    {
+        "title": "Inbounds for January 2024 and 2025 (display month name, sort chronologically)",
+        "question": "How many inbounds for January 2024 and 2025?",
+        "sql": 'SELECT "year", "month_name", COUNT(*) as inbound_count FROM data_orders WHERE LOWER("order_type") = \'inbound\' AND "month" = 1 AND ("year" = 2024 OR "year" = 2025) GROUP BY "year", "month_name", "month" ORDER BY "year", "month"',
+    },
+    {
+        "title": "All sales orders (always include order_class in the SELECT clause when filtering by order_class)",
+        "question": "How many sales orders?",
+        "sql": 'SELECT "order_class", COUNT(*) as sales_order_count FROM data_orders WHERE "order_class" ILIKE \'%Sales Order%\' GROUP BY "order_class"',
+    },
+    {
+        "title": "All sales orders per month (display month name, sort chronologically)",
+        "question": "How many sales orders per month?",
+        "sql": 'SELECT "order_class", "month_name", COUNT(*) as sales_order_count FROM data_orders WHERE "order_class" ILIKE \'%Sales Order%\' GROUP BY "order_class", "month_name", "month" ORDER BY "order_class", "month"',
+    },
+    {
+        "title": "All sales orders per date (always include order_class in the SELECT clause when filtering by order_class)",
+        "question": "How many sales orders per date?",
+        "sql": 'SELECT "order_class", "date", COUNT(*) as sales_order_count FROM data_orders WHERE "order_class" ILIKE \'%Sales Order%\' GROUP BY "order_class", "date" ORDER BY "date"',
+    },
+    {
+        "title": "Listing unique customer names with a filter",
+        "question": "What customers' names start with the letter A?",
+        "sql": 'SELECT DISTINCT "customer" FROM data_orders WHERE "customer" ILIKE \'a%\' ORDER BY "customer"',
+    },
+    {
+        "title": "Counting specific order_class for customers matching a name pattern",
+        "question": "How many sales orders for customers whose names start with B?",
+        "sql": 'SELECT "customer", "order_class", COUNT(*) as count FROM data_orders WHERE "customer" ILIKE \'b%\' AND "order_class" ILIKE \'%Sales Order%\' GROUP BY "customer", "order_class" ORDER BY "customer", "order_class"',
+    },
+    {
+        "title": "Count orders per month (display month name, sort chronologically by month number)",
+        "question": "How many orders per month?",
+        "sql": 'SELECT "month_name", COUNT(*) as order_count FROM data_orders GROUP BY "month_name", "month" ORDER BY "month"',
+    },
+]
+
+# --- Token counting ---
+
+_encoding = None
+_encoding_unavailable = False
+
+def load_token_encoding():
+    """
+    Loads the tiktoken encoding of the SQL-generation model. The first load may download
+    the BPE file, so call it off the event loop at startup. If it cannot be loaded,
+    count_tokens falls back to an estimate.
+    """
+    global _encoding, _encoding_unavailable
+    if _encoding is not None or _encoding_unavailable:
+        return
+    try:
+        import tiktoken
+        _encoding = tiktoken.encoding_for_model(settings.SQL_MODEL)
+    except Exception as e:
+        print(f"Could not load the tiktoken encoding, token counts will be estimated: {e}")
+        _encoding_unavailable = True
+
+def count_tokens(text: str) -> int:
+    if _encoding is not None:
+        return len(_encoding.encode(text))
+    # Roughly 4 characters per token for English text
+    return math.ceil(len(text) / 4)
+
+# --- Example ranking ---
+
+_STOPWORDS = {
+    "a", "an", "the", "are", "is", "there", "can", "you", "me", "i", "have", "all", "of", "for",
+    "in", "by", "per", "and", "or", "to", "what", "how", "many", "please", "could", "show", "with",
+    "whose", "that", "do", "does", "my",
+}
+# Terms users use interchangeably are mapped to one token so they match each other
+_SYNONYMS = {
+    "shipment": "order", "orders": "order", "shipments": "order",
+    "inbounds": "inbound", "outbounds": "outbound",
+    "classes": "class", "types": "type", "names": "name", "customers": "customer",
+    "dates": "date", "days": "day", "daily": "day", "weeks": "week", "weekly": "week",
+    "months": "month", "monthly": "month", "years": "year", "yearly": "year", "quarters": "quarter",
+    "starts": "start", "starting": "start", "letter": "start",
+}
+_MONTH_NAMES = {
+    "january", "february", "march", "april", "may", "june", "july",
+    "august", "september", "october", "november", "december",
+}
+
+def tokenize(text: str) -> List[str]:
+    """Splits text into normalized search terms (stopwords removed, synonyms, months and years folded)."""
+    tokens = []
+    for word in re.findall(r"[a-z0-9]+", text.lower()):
+        if word in _STOPWORDS:
+            continue
+        if word in _MONTH_NAMES:
+            word = "month"
+        elif re.fullmatch(r"(19|20)\d\d", word):
+            word = "year"
+        tokens.append(_SYNONYMS.get(word, word))
+    return tokens
+
+class TfidfIndex:
+    """TF-IDF vectors of a fixed set of documents, scored by cosine similarity to a query (no network call)."""
+
+    def __init__(self, documents: Sequence[str]):
+        term_counts = [Counter(tokenize(document)) for document in documents]
+        document_frequency = Counter(term for doc in term_counts for term in doc)
+        self._idf = {
+            term: math.log((1 + len(term_counts)) / (1 + df)) + 1 for term, df in document_frequency.items()
+        }
+        self._vectors = [self._tfidf(doc) for doc in term_counts]
+
+    def _tfidf(self, terms: Counter) -> Dict[str, float]:
+        vector = {term: count * self._idf.get(term, 0.0) for term, count in terms.items()}
+        norm = math.sqrt(sum(v * v for v in vector.values())) or 1.0
+        return {term: v / norm for term, v in vector.items()}
+
+    def scores(self, query: str) -> List[float]:
+        """Returns the similarity of the query to each document, in document order."""
+        query_vector = self._tfidf(Counter(tokenize(query)))
+        return [sum(weight * vector.get(term, 0.0) for term, weight in query_vector.items()) for vector in self._vectors]
+
+async def cached_embeddings(embedder, texts: Sequence[str], cache_prefix: str) -> List[List[float]]:
+    """Embeds the texts once; the vectors are shared between workers through the cache."""
+    cache_key = f"{cache_prefix}:" + hashlib.sha256("\n".join(texts).encode()).hexdigest()
+    embeddings = await get_shared_cache().get(cache_key)
+    if embeddings is None:
+        embeddings = await embedder.aembed_documents(list(texts))
+        await get_shared_cache().set(cache_key, embeddings)
+    return embeddings
+
+# Question embeddings computed recently in this worker, keyed by question text
+QUESTION_EMBEDDING_CACHE_SIZE = 256
+_question_embeddings: "OrderedDict[str, List[float]]" = OrderedDict()
+
+async def embed_question(embedder, question: str) -> List[float]:
+    """
+    Embeds a question once for every selector that ranks by embeddings (examples and tables
+    use the same OpenAI model), and keeps it for repeated questions.
+    """
+    embedding = _question_embeddings.get(question)
+    if embedding is None:
+        embedding = await embedder.aembed_query(question)
+        _question_embeddings[question] = embedding
+        while len(_question_embeddings) > QUESTION_EMBEDDING_CACHE_SIZE:
+            _question_embeddings.popitem(last=False)
+    _question_embeddings.move_to_end(question)
+    return embedding
+
+_TABLE_REFERENCE = re.compile(r'\b(?:from|join)\s+"?([a-z_][\w.]*)"?', re.IGNORECASE)
+
+def example_tables(example: Dict[str, Any]) -> FrozenSet[str]:
+    """Returns the tables an example's SQL reads (its "tables" entry when given)."""
+    if example.get("tables"):
+        return frozenset(example["tables"])
+    return frozenset(_TABLE_REFERENCE.findall(example["sql"]))
+
+class ExampleLibrary:
+    """
+    Indexed few-shot examples. Ranks examples by TF-IDF cosine similarity of their questions
+    (no network call), or by embedding similarity when SQL_EXAMPLE_SELECTOR is "embedding".
+    """
+
+    def __init__(self, examples: Sequence[Dict[str, str]]):
+        self.examples = list(examples)
+        self.rendered = [self._render(i, example) for i, example in enumerate(self.examples)]
+        self.tables = [example_tables(example) for example in self.examples]
+        self.token_counts: List[int] = []
+        self._index = TfidfIndex([example["question"] for example in self.examples])
+        self._embeddings: Optional[List[List[float]]] = None
+        self._embedder = None
+
+    @staticmethod
+    def _render(index: int, example: Dict[str, str]) -> str:
+        return f"# Example {index + 1}: {example['title']}\nQuestion: {example['question']}\nSQLQuery: {example['sql']}"
+
+    def count_example_tokens(self):
+        # Separate method so it can run after load_token_encoding()
+        self.token_counts = [count_tokens(text + "\n\n") for text in self.rendered]
+
+    async def load_embeddings(self):
+        """Embeds the example questions once; the vectors are shared between workers through the cache."""
+        from langchain_openai import OpenAIEmbeddings
+
+        self._embedder = OpenAIEmbeddings(openai_api_key=settings.OPENAI_API_KEY)
+        questions = [example["question"] for example in self.examples]
+        self._embeddings = await cached_embeddings(self._embedder, questions, "sql_example_embeddings")
+
+    @property
+    def embedder(self):
+        """The embeddings client when examples are ranked by embeddings, otherwise None."""
+        return self._embedder if self._embeddings is not None else None
+
+    async def rank(self, question: str, question_embedding: Optional[List[float]] = None) -> List[Tuple[int, float]]:
+        """Returns (example index, similarity) pairs, most similar first."""
+        if self._embeddings is not None:
+            query = question_embedding if question_embedding is not None else await embed_question(self._embedder, question)
+            scores = [sum(a * b for a, b in zip(query, emb)) for emb in self._embeddings]
+        else:
+            scores = self._index.scores(question)
+        return sorted(enumerate(scores), key=lambda pair: pair[1], reverse=True)
+
+example_library = ExampleLibrary(SQL_EXAMPLES)
+
+async def initialize_example_library():
+    """Prepares token counting and the example index; called once per worker at startup."""
+    await asyncio.to_thread(load_token_encoding)
+    example_library.count_example_tokens()
+    if settings.SQL_EXAMPLE_SELECTOR == "embedding":
+        try:
+            await example_library.load_embeddings()
+        except Exception as e:
+            print(f"Could not embed SQL examples, falling back to lexical selection: {e}")
+
+def render_examples(indexes: Sequence[int]) -> str:
+    return "\n\n".join(example_library.rendered[i] for i in indexes)
+
+async def select_examples(
+    question: str,
+    fixed_prompt_tokens: int,
+    max_examples: Optional[int] = None,
+    token_budget: Optional[int] = None,
+    exclude: Sequence[int] = (),
+    question_embedding: Optional[List[float]] = None,
+    table_names: Optional[Sequence[str]] = None,
+) -> Tuple[str, int, List[int]]:
+    """
+    Picks the examples most similar to the question, up to `max_examples`, while the whole
+    prompt stays within `token_budget` tokens. `fixed_prompt_tokens` is the size of the rest
+    of the prompt (instructions, table info and question). When `table_names` is given, only
+    examples that read nothing but those tables are considered.
+    If not even one example fits, the best match is kept anyway (complex questions with large
+    table info need guidance the most) and the overrun is counted in the prompt stats.
+    Returns the rendered examples, the resulting prompt token count and the chosen indexes.
+    """
+    max_examples = settings.SQL_PROMPT_MAX_EXAMPLES if max_examples is None else max_examples
+    token_budget = settings.SQL_PROMPT_TOKEN_BUDGET if token_budget is None else token_budget
+    if not example_library.token_counts:
+        example_library.count_example_tokens()
+
+    chosen: List[int] = []
+    prompt_tokens = fixed_prompt_tokens
+    selected_tables = frozenset(table_names) if table_names is not None else None
+    candidates = [
+        index for index, _score in await example_library.rank(question, question_embedding)
+        if index not in exclude and (selected_tables is None or example_library.tables[index] <= selected_tables)
+    ]
+    for index in candidates:
+        if len(chosen) >= max_examples:
+            break
+        if prompt_tokens + example_library.token_counts[index] > token_budget:
+            continue
+        chosen.append(index)
+        prompt_tokens += example_library.token_counts[index]
+    if not chosen and candidates and max_examples > 0:
+        best = candidates[0]
+        chosen.append(best)
+        prompt_tokens += example_library.token_counts[best]
+        _prompt_token_stats["over_budget"] += 1
+        print(f"SQL prompt over the token budget ({prompt_tokens} > {token_budget}); kept the best-matching example only")
+    return render_examples(chosen), prompt_tokens, chosen
+
+# --- Prompt size reporting ---
+
+_prompt_token_stats = {"requests": 0, "total_tokens": 0, "max_tokens": 0, "last_tokens": 0, "over_budget": 0}
+
+def record_prompt_tokens(prompt_tokens: int):
+    _prompt_token_stats["requests"] += 1
+    _prompt_token_stats["total_tokens"] += prompt_tokens
+    _prompt_token_stats["max_tokens"] = max(_prompt_token_stats["max_tokens"], prompt_tokens)
+    _prompt_token_stats["last_tokens"] = prompt_tokens
+
+def get_prompt_token_stats() -> Dict[str, Any]:
+    requests = _prompt_token_stats["requests"]
+    return {
+        "requests": requests,
+        "avg_tokens": round(_prompt_token_stats["total_tokens"] / requests, 1) if requests else 0,
+        "max_tokens": _prompt_token_stats["max_tokens"],
+        "last_tokens": _prompt_token_stats["last_tokens"],
+        "token_budget": settings.SQL_PROMPT_TOKEN_BUDGET,
+        "over_budget": _prompt_token_stats["over_budget"],
+        "selector": settings.SQL_EXAMPLE_SELECTOR,
+    }
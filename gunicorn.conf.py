@@ -0,0 +1,20 @@
+# Gunicorn configuration for the multi-worker deployment profile.
+# Usage: gunicorn app.main:app -c gunicorn.conf.py
+import os
+
+bind = f"0.0.0.0:{os.getenv('PORT', '8080')}"
+worker_class = "uvicorn.workers.UvicornWorker"
+workers = int(os.getenv("WEB_CONCURRENCY", "2"))
+
+# The app is imported in each worker after the fork (no preload), and heavy state
+# (SQLDatabase, LangChain chain, PGVector) is built in the FastAPI lifespan, so no
+# database connection is ever shared between processes.
+preload_app = False
+
+# LLM round trips can take a while; keep this above the slowest expected chat request
+timeout = int(os.getenv("GUNICORN_TIMEOUT", "120"))
+graceful_timeout = 30
+keepalive = 5
+
+accesslog = "-"
+errorlog = "-"
@@ -0,0 +1,44 @@
+import sys
+import os
+import asyncio
+import argparse
+import time
+# Adds the project root to sys.path automatically
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from jose import jwt
+from app.core.config import settings
+from app.core.security import get_current_user, clear_token_cache, preload_signing_keys
+
+# Microbenchmark of the auth dependency: every request resends the same bearer token,
+# as the frontend does, and is compared against full verification on every call.
+parser = argparse.ArgumentParser(description="Benchmark the get_current_user dependency.")
+parser.add_argument('--requests', type=int, default=50000, help='Number of simulated requests')
+parser.add_argument('--tokens', type=int, default=100, help='Number of distinct tokens (users) in rotation')
+args = parser.parse_args()
+
+def build_tokens(count: int) -> list[str]:
+    exp = int(time.time()) + 3600
+    return [
+        "Bearer " + jwt.encode({"user_id": i, "exp": exp}, settings.JWT_SECRET_KEY, algorithm=settings.ALGORITHM)
+        for i in range(count)
+    ]
+
+async def run(headers: list[str], requests: int, use_cache: bool) -> float:
+    clear_token_cache()
+    start = time.perf_counter()
+    for i in range(requests):
+        if not use_cache:
+            clear_token_cache()
+        await get_current_user(headers[i % len(headers)])
+    return time.perf_counter() - start
+
+async def main():
+    await preload_signing_keys()
+    headers = build_tokens(args.tokens)
+    for label, use_cache in (("uncached", False), ("cached", True)):
+        elapsed = await run(headers, args.requests, use_cache)
+        print(f"{label:>9}: {args.requests} calls in {elapsed:.3f}s -> "
+              f"{args.requests / elapsed:,.0f} calls/s, {elapsed / args.requests * 1e6:.1f} us/call")
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,77 @@
+import sys
+import os
+import argparse
+import json
+import random
+import statistics
+import time
+# Adds the project root to sys.path automatically
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from fastapi.encoders import jsonable_encoder
+from app.core.compression import COMPRESSORS
+from app.schemas.chat import ChatResponse
+
+# Measures the response layer for large chat results, without a database or API keys:
+# serialization time of a ChatResponse (FastAPI's default encoder path vs pydantic-core)
+# and bytes on the wire / compression time for each negotiated encoding.
+# Rows are synthetic but shaped like data_orders query results (strings, ISO dates, numbers).
+parser = argparse.ArgumentParser(description="Benchmark response serialization and compression.")
+parser.add_argument('--rows', default='100,1000,10000,50000', help='Comma-separated result sizes (rows in json_data)')
+parser.add_argument('--runs', type=int, default=5, help='Repetitions per measurement')
+args = parser.parse_args()
+
+CUSTOMERS = [f"Customer {name}" for name in ("Acme", "Bravo", "Contoso", "Delta", "Echo", "Fabrikam", "Globex")]
+ORDER_CLASSES = ["Sales Order", "Purchase Order", "Return", "Warehouse Transfer", "Material Transfer"]
+MONTHS = ["January", "February", "March", "April", "May", "June", "July",
+          "August", "September", "October", "November", "December"]
+
+def synthetic_rows(count: int) -> list[dict]:
+    rng = random.Random(42)
+    rows = []
+    for i in range(count):
+        month = rng.randint(1, 12)
+        rows.append({
+            "order_number": f"ORD-{100000 + i}",
+            "order_type": rng.choice(["Inbound", "Outbound"]),
+            "order_class": rng.choice(ORDER_CLASSES),
+            "customer": rng.choice(CUSTOMERS),
+            "date": f"2024-{month:02d}-{rng.randint(1, 28):02d}",
+            "month": month,
+            "month_name": MONTHS[month - 1],
+            "quantity": str(rng.randint(1, 5000)),  # Decimals are returned as strings
+        })
+    return rows
+
+def timed(func, runs: int) -> tuple[float, object]:
+    durations, result = [], None
+    for _ in range(runs):
+        start = time.perf_counter()
+        result = func()
+        durations.append(time.perf_counter() - start)
+    return statistics.median(durations), result
+
+def main():
+    for count in [int(n) for n in args.rows.split(',')]:
+        response = ChatResponse(
+            answer="Here are the orders you asked for.", user_id="42",
+            json_data=synthetic_rows(count), export_id="0" * 32
+        )
+        default_time, default_body = timed(
+            lambda: json.dumps(jsonable_encoder(response), ensure_ascii=False, separators=(",", ":")).encode(), args.runs
+        )
+        pydantic_time, body = timed(lambda: response.model_dump_json().encode(), args.runs)
+        assert json.loads(default_body) == json.loads(body)
+
+        print(f"\n{count} rows, {len(body) / 1024:.0f} KiB of JSON")
+        print(f"  serialization  jsonable_encoder+json.dumps {default_time * 1000:8.1f} ms"
+              f"   model_dump_json {pydantic_time * 1000:8.1f} ms ({default_time / pydantic_time:.1f}x)")
+        print(f"  {'encoding':>9} {'bytes':>10} {'ratio':>7} {'ms':>8}")
+        print(f"  {'identity':>9} {len(body):>10} {1:>7.1f} {0:>8.1f}")
+        for encoding, compressor_class in COMPRESSORS.items():
+            seconds, compressed = timed(lambda: compressor_class().compress(body, final=True), args.runs)
+            print(f"  {encoding:>9} {len(compressed):>10} {len(body) / len(compressed):>7.1f} {seconds * 1000:>8.1f}")
+        # A revalidated answer (If-None-Match hit) sends headers only
+        print(f"  {'304':>9} {0:>10}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,67 @@
+import sys
+import os
+import argparse
+import asyncio
+import statistics
+import time
+# Adds the project root to sys.path automatically
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from app.core.profiling import profile_request, stage, start_profiling, stop_profiling
+
+# Measures the per-request cost of the profiling hooks on a synthetic request (a few awaits
+# and some CPU work split in stages), without a database or API keys:
+# - "none": no hooks at all
+# - "off": profile_request + stage timings with profiling off (the default for every chat request)
+# - "sample": the async-aware stack sampler running for the whole request
+# The added time is fixed per request (plus per stage), so compare it with real chat latencies
+# (hundreds of milliseconds to seconds), not with this synthetic request.
+parser = argparse.ArgumentParser(description="Benchmark the overhead of request profiling.")
+parser.add_argument('--requests', type=int, default=2000, help='Requests per mode')
+parser.add_argument('--stages', type=int, default=8, help='Stages timed per request')
+args = parser.parse_args()
+
+def work():
+    return sum(i * i for i in range(2000))
+
+async def request_without_hooks():
+    for _ in range(args.stages):
+        await asyncio.sleep(0)
+        work()
+
+async def request_with_hooks(mode):
+    async with profile_request("benchmark", mode, "header" if mode else "slow"):
+        for i in range(args.stages):
+            with stage(f"stage_{i}"):
+                await asyncio.sleep(0)
+                work()
+
+async def measure(run, requests: int) -> list[float]:
+    durations = []
+    for _ in range(requests):
+        start = time.perf_counter()
+        await run()
+        durations.append(time.perf_counter() - start)
+    return durations
+
+async def main():
+    start_profiling()
+    modes = {
+        "none": request_without_hooks,
+        "off": lambda: request_with_hooks(None),
+        "sample": lambda: request_with_hooks("sample"),
+    }
+    # Sampled requests are stored; keep that part of the run short
+    requests = {"none": args.requests, "off": args.requests, "sample": max(1, args.requests // 20)}
+    await measure(modes["off"], 100)  # Warm-up
+    baseline = None
+    print(f"{'mode':>7} {'requests':>9} {'median us':>10} {'p95 us':>8} {'added us':>9}")
+    for mode, run in modes.items():
+        durations = sorted(await measure(run, requests[mode]))
+        median = statistics.median(durations)
+        baseline = baseline or median
+        p95 = durations[max(0, int(len(durations) * 0.95) - 1)]
+        print(f"{mode:>7} {len(durations):>9} {median * 1e6:>10.0f} {p95 * 1e6:>8.0f} {(median - baseline) * 1e6:>9.0f}")
+    stop_profiling()
+
+if __name__ == "__main__":
+    asyncio.run(main())
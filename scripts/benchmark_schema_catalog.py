@@ -0,0 +1,97 @@
+import sys
+import os
+import argparse
+import asyncio
+import statistics
+import time
+# Adds the project root to sys.path automatically
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from sqlalchemy import create_engine, text
+from app.services.database_service import custom_sql_query_prompt
+from app.services.schema_catalog_service import SchemaCatalog, build_table_entries
+from app.services.sql_prompt_service import SQL_EXAMPLES, count_tokens, load_token_encoding
+
+# Compares the SQL prompt size when every table is described (what include_tables=<all> would
+# send) with the schema catalogue, which only describes the tables relevant to each question.
+# Runs on an in-memory SQLite database with synthetic warehouse tables (data_orders plus
+# generated ones), so it needs no PostgreSQL or API keys. Retrieval is lexical.
+parser = argparse.ArgumentParser(description="Benchmark schema catalogue table selection.")
+parser.add_argument('--tables', default='1,10,100', help='Comma-separated catalogue sizes')
+parser.add_argument('--max-tables', type=int, default=3, help='Max tables selected per question')
+args = parser.parse_args()
+
+SUBJECTS = [
+    "inventory", "carrier", "invoice", "warehouse", "supplier", "product", "pallet", "dock", "route",
+    "driver", "vehicle", "employee", "shift", "location", "bin", "lot", "receipt", "claim", "rate",
+    "contract", "forecast", "sku", "vendor", "zone", "container",
+]
+# Each kind of table has its own columns, and a question template that uses them
+TABLE_KINDS = {
+    "levels": (["quantity_on_hand", "reorder_point", "unit_of_measure"],
+               "What is the quantity on hand and reorder point of each {subject}?"),
+    "events": (["event_type", "event_time", "event_source"],
+               "List the latest {subject} events by event type"),
+    "history": (["valid_from", "valid_to", "changed_by"],
+                "Who changed {subject} history records and when were they valid from?"),
+    "summary": (["period", "total_amount", "record_count"],
+                "What is the total amount per period in the {subject} summary?"),
+}
+DATA_ORDERS_COLUMNS = [
+    "order_number", "shipment_number", "order_type", "order_class", "customer",
+    "date", "year", "month", "month_name", "quarter", "week", "day",
+]
+
+def synthetic_tables(count: int) -> list[tuple[str, list[str], list[str]]]:
+    """Returns (table name, columns, questions) for data_orders and count - 1 generated tables."""
+    tables = [("data_orders", DATA_ORDERS_COLUMNS, [example["question"] for example in SQL_EXAMPLES])]
+    for kind, (columns, question) in TABLE_KINDS.items():
+        for subject in SUBJECTS:
+            tables.append((f"{subject}_{kind}", [f"{subject}_id", f"{subject}_name"] + columns + ["created_at"],
+                           [question.format(subject=subject)]))
+    # Interleave kinds so small catalogues still mix table shapes
+    generated = sorted(tables[1:], key=lambda table: (SUBJECTS.index(table[0].split("_")[0]), table[0]))
+    return (tables[:1] + generated)[:count]
+
+def create_database(tables) -> object:
+    engine = create_engine("sqlite://")
+    with engine.begin() as conn:
+        for name, columns, _ in tables:
+            conn.execute(text(f'CREATE TABLE "{name}" ({", ".join(f"{c} TEXT" for c in columns)})'))
+            for row in range(3):
+                values = {column: f"{column}_{row}" for column in columns}
+                conn.execute(
+                    text(f'INSERT INTO "{name}" VALUES ({", ".join(":" + c for c in columns)})'), values
+                )
+    return engine
+
+async def main():
+    load_token_encoding()
+    fixed_tokens = count_tokens(custom_sql_query_prompt.format(input="", table_info="", top_k="5", examples="", table_notes=""))
+    print(f"Fixed prompt (instructions, no tables or examples): {fixed_tokens} tokens")
+    print(f"\n{'tables':>6} {'build s':>8} {'all-tables tokens':>18} {'catalogue avg':>14} {'max':>6} "
+          f"{'recall':>7} {'select us':>10}")
+
+    for count in [int(n) for n in args.tables.split(',')]:
+        tables = synthetic_tables(count)
+        engine = create_database(tables)
+        start = time.perf_counter()
+        entries = build_table_entries(engine, [name for name, _, _ in tables])
+        build_seconds = time.perf_counter() - start
+        catalog = SchemaCatalog(entries)
+        all_tables_tokens = fixed_tokens + count_tokens(catalog.render_table_info(catalog.table_names))
+
+        prompt_tokens, durations, hits, total = [], [], 0, 0
+        for name, _, questions in tables:
+            for question in questions:
+                start = time.perf_counter()
+                chosen, table_tokens = await catalog.select_tables(question, max_tables=args.max_tables)
+                durations.append(time.perf_counter() - start)
+                prompt_tokens.append(fixed_tokens + table_tokens + count_tokens(question))
+                hits += name in chosen
+                total += 1
+        print(f"{count:>6} {build_seconds:>8.2f} {all_tables_tokens:>18} {statistics.mean(prompt_tokens):>14.0f} "
+              f"{max(prompt_tokens):>6} {hits / total:>7.1%} {statistics.median(durations) * 1e6:>10.0f}")
+        engine.dispose()
+
+if __name__ == "__main__":
+    asyncio.run(main())
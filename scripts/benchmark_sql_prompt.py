@@ -0,0 +1,76 @@
+import sys
+import os
+import asyncio
+import argparse
+import statistics
+import time
+# Adds the project root to sys.path automatically
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from sqlalchemy import text
+from app.db.session import AsyncSessionLocal
+from app.services import database_service, schema_catalog_service
+from app.services.database_service import custom_sql_query_prompt, initialize_text_to_sql, render_table_notes
+from app.services.sql_prompt_service import SQL_EXAMPLES, count_tokens, render_examples, select_examples
+
+# Compares the static prompt (every example) with dynamic few-shot selection.
+# Leave-one-out: each worked example's question is asked with that example removed from the
+# library, and the generated SQL is counted as correct when it returns the same rows as the
+# example's reference SQL. Needs the service environment (.env with DATABASE_URL and OPENAI_API_KEY).
+parser = argparse.ArgumentParser(description="Benchmark static vs dynamic SQL-generation prompts.")
+parser.add_argument('--runs', type=int, default=1, help='Repetitions per question and mode')
+args = parser.parse_args()
+
+async def run_sql(db, query: str):
+    """Returns the rows as a comparable, order-insensitive value, or None if the query fails."""
+    try:
+        result = await db.execute(text(query))
+        return sorted(tuple(sorted(str(v) for v in row)) for row in result.all())
+    except Exception:
+        await db.rollback()
+        return None
+
+async def generate_sql(question: str, table_info: str, table_notes: str, example_indexes: list[int]) -> tuple[str, int, float]:
+    prompt = custom_sql_query_prompt.format(
+        input=question + "\nSQLQuery: ", table_info=table_info, top_k="5", examples=render_examples(example_indexes),
+        table_notes=table_notes
+    )
+    start = time.perf_counter()
+    response = await database_service.llm.bind(stop=["\nSQLResult:"]).ainvoke(prompt)
+    latency = time.perf_counter() - start
+    return response.content.strip(), count_tokens(prompt), latency
+
+async def main():
+    await initialize_text_to_sql()
+    # The worked examples are all about the default table
+    catalog = schema_catalog_service.schema_catalog
+    table_info = catalog.render_table_info([catalog.default_table])
+    table_notes = render_table_notes([catalog.default_table])
+    fixed_tokens = database_service.fixed_prompt_tokens + catalog.token_counts[catalog.default_table] + count_tokens(table_notes)
+    results = {"static": [], "dynamic": []}
+
+    async with AsyncSessionLocal() as db:
+        for i, example in enumerate(SQL_EXAMPLES):
+            question = example["question"]
+            expected = await run_sql(db, example["sql"])
+            static_indexes = [j for j in range(len(SQL_EXAMPLES)) if j != i]
+            _, _, dynamic_indexes = await select_examples(
+                question, fixed_tokens + count_tokens(question), exclude=[i], table_names=[catalog.default_table]
+            )
+
+            for mode, indexes in (("static", static_indexes), ("dynamic", dynamic_indexes)):
+                for _ in range(args.runs):
+                    sql, tokens, latency = await generate_sql(question, table_info, table_notes, indexes)
+                    correct = expected is not None and await run_sql(db, sql) == expected
+                    results[mode].append({"tokens": tokens, "latency": latency, "correct": correct})
+                    print(f"[{mode:>7}] {'OK  ' if correct else 'FAIL'} {tokens:>5} tokens {latency * 1000:>7.0f} ms  {question}")
+
+    print(f"\n{'mode':>8} {'accuracy':>9} {'avg tokens':>11} {'p50 ms':>8} {'p95 ms':>8}")
+    for mode, rows in results.items():
+        latencies = sorted(r["latency"] for r in rows)
+        accuracy = sum(r["correct"] for r in rows) / len(rows)
+        avg_tokens = statistics.mean(r["tokens"] for r in rows)
+        p95 = latencies[max(0, int(len(latencies) * 0.95) - 1)]
+        print(f"{mode:>8} {accuracy:>9.1%} {avg_tokens:>11.0f} {statistics.median(latencies) * 1000:>8.0f} {p95 * 1000:>8.0f}")
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,110 @@
+import sys
+import os
+import asyncio
+import argparse
+import statistics
+import subprocess
+import time
+import httpx
+from dotenv import load_dotenv
+
+# Scaling benchmark: starts the app with 1, 2, 4 and 8 uvicorn workers and measures
+# throughput and latency under the same concurrent load for each configuration.
+# The chat target needs the same environment as the service (.env with DATABASE_URL,
+# OPENAI_API_KEY and TEST_JWT_TOKEN); the root target only measures the server itself.
+parser = argparse.ArgumentParser(description="Benchmark the service with different worker counts.")
+parser.add_argument('--workers', default='1,2,4,8', help='Comma-separated worker counts')
+parser.add_argument('--concurrency', type=int, default=32, help='Concurrent clients')
+parser.add_argument('--duration', type=float, default=30, help='Seconds of load per configuration')
+parser.add_argument('--port', type=int, default=8090, help='Port used for the benchmark server')
+parser.add_argument('--target', choices=['chat', 'root'], default='chat', help='Endpoint to load')
+args = parser.parse_args()
+
+BASE_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+QUESTIONS_FILE = os.path.join(BASE_DIR, "test_questions.txt")
+
+load_dotenv()
+TOKEN = os.getenv("TEST_JWT_TOKEN", "YOUR_JWT_TOKEN_HERE")
+
+with open(QUESTIONS_FILE, "r", encoding="utf-8") as f:
+    questions = [line.strip() for line in f if line.strip() and not line.strip().startswith('#')]
+
+def start_server(workers: int) -> subprocess.Popen:
+    env = dict(os.environ, CACHE_BACKEND=os.getenv("CACHE_BACKEND", "file"))
+    return subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--host", "127.0.0.1",
+         "--port", str(args.port), "--workers", str(workers), "--log-level", "warning"],
+        cwd=BASE_DIR,
+        env=env,
+    )
+
+async def wait_until_ready(client: httpx.AsyncClient, timeout: float = 120):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            if (await client.get("/")).status_code == 200:
+                return
+        except httpx.TransportError:
+            pass
+        await asyncio.sleep(0.5)
+    raise RuntimeError("Server did not become ready in time")
+
+async def client_loop(client: httpx.AsyncClient, client_idx: int, deadline: float, latencies: list[float], errors: list[int]):
+    idx = client_idx
+    while time.monotonic() < deadline:
+        start = time.perf_counter()
+        try:
+            if args.target == "chat":
+                response = await client.post(
+                    "/api/v1/chat/",
+                    json={"message": questions[idx % len(questions)], "user_id": "benchmark"},
+                    headers={"Authorization": f"Bearer {TOKEN}"},
+                )
+            else:
+                response = await client.get("/")
+            if response.status_code != 200:
+                errors.append(response.status_code)
+        except httpx.HTTPError:
+            errors.append(0)
+        latencies.append(time.perf_counter() - start)
+        idx += args.concurrency
+
+async def run_configuration(workers: int) -> dict:
+    server = start_server(workers)
+    try:
+        async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{args.port}", timeout=300) as client:
+            await wait_until_ready(client)
+            latencies: list[float] = []
+            errors: list[int] = []
+            start = time.monotonic()
+            deadline = start + args.duration
+            await asyncio.gather(*[
+                client_loop(client, i, deadline, latencies, errors) for i in range(args.concurrency)
+            ])
+            elapsed = time.monotonic() - start
+    finally:
+        server.terminate()
+        server.wait()
+
+    latencies.sort()
+    return {
+        "workers": workers,
+        "requests": len(latencies),
+        "rps": len(latencies) / elapsed,
+        "p50_ms": statistics.median(latencies) * 1000 if latencies else 0,
+        "p95_ms": latencies[int(len(latencies) * 0.95) - 1] * 1000 if latencies else 0,
+        "errors": len(errors),
+    }
+
+async def main():
+    results = []
+    for workers in [int(w) for w in args.workers.split(",")]:
+        print(f"Running with {workers} worker(s)...")
+        results.append(await run_configuration(workers))
+
+    print(f"\n{'workers':>7} {'requests':>9} {'req/s':>9} {'p50 ms':>9} {'p95 ms':>9} {'errors':>7}")
+    for r in results:
+        print(f"{r['workers']:>7} {r['requests']:>9} {r['rps']:>9.1f} {r['p50_ms']:>9.1f} {r['p95_ms']:>9.1f} {r['errors']:>7}")
+
+if __name__ == "__main__":
+    asyncio.run(main())
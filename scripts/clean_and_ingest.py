@@ -3,16 +3,22 @@ import os
 import asyncio
 # Agrega la raíz del proyecto al sys.path automáticamente
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
-from app.db.session import AsyncSessionLocal
-from app.services.vector_store_service import clear_vector_store, ingest_table_to_vector_store
+from app.core.config import settings
+from app.services.vector_store_service import count_table_rows, rebuild_vector_store
 
+# Blue/green rebuild: data_orders is ingested into a shadow collection that replaces the live
+# one when complete, so lookups keep working during the rebuild.
+# With the service running, prefer POST /api/v1/admin/vector-store/reindex (background job with progress).
 async def main():
-    print("Limpiando el vector store...")
-    clear_vector_store()
-    print("Vector store limpio. Ingresando data_orders...")
-    async with AsyncSessionLocal() as db:
-        await ingest_table_to_vector_store("data_orders", db)
-    print("Proceso completado.")
+    total = await asyncio.to_thread(count_table_rows, "data_orders")
+    print(f"Rebuilding the vector store from data_orders ({total} rows)...")
+    processed = await asyncio.to_thread(
+        rebuild_vector_store,
+        "data_orders",
+        batch_size=settings.INGEST_BATCH_SIZE,
+        on_progress=lambda n: print(f"  {n}/{total} rows"),
+    )
+    print(f"Proceso completado: {processed} rows.")
 
 if __name__ == "__main__":
     asyncio.run(main())